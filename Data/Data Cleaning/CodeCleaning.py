@@ -61,65 +61,66 @@ def removeNoIMDBID(data):
     return data
 
 
-#USER OPTIONS:
-useFullDataSet = True
-numberOfRows = 100000
+if __name__ == "__main__":
+    #USER OPTIONS:
+    useFullDataSet = True
+    numberOfRows = 100000
 
-#Set file location
-file_location = "TMDB_movie_dataset_v11.csv"
-cleaned_destination = "cleaned_data.csv"
+    #Set file location
+    file_location = "TMDB_movie_dataset_v11.csv"
+    cleaned_destination = "cleaned_data.csv"
 
-if useFullDataSet:
-    data = pd.read_csv(file_location)
-else: 
-    data = pd.read_csv(file_location, nrows=numberOfRows)
+    if useFullDataSet:
+        data = pd.read_csv(file_location)
+    else: 
+        data = pd.read_csv(file_location, nrows=numberOfRows)
 
-#Delete cleaned data if it exists in this directory
-if os.path.exists(cleaned_destination):
-    # Delete the file
-    os.remove(cleaned_destination)
-    print(f"{cleaned_destination} has been deleted.")
-else:
-    print(f"{cleaned_destination} does not exist.")
+    #Delete cleaned data if it exists in this directory
+    if os.path.exists(cleaned_destination):
+        # Delete the file
+        os.remove(cleaned_destination)
+        print(f"{cleaned_destination} has been deleted.")
+    else:
+        print(f"{cleaned_destination} does not exist.")
 
 
-#Perform functions on the data set:
+    #Perform functions on the data set:
 
-data = analyzeCleaningFunction(removeDuplicates, data)
+    data = analyzeCleaningFunction(removeDuplicates, data)
 
-data = analyzeCleaningFunction(removeUnreleased, data)
+    data = analyzeCleaningFunction(removeUnreleased, data)
 
-data = analyzeCleaningFunction(removeFutureRelease, data)
+    data = analyzeCleaningFunction(removeFutureRelease, data)
 
-data = analyzeCleaningFunction(removePorn, data)
+    data = analyzeCleaningFunction(removePorn, data)
 
-data = analyzeCleaningFunction(removeDuplicateID, data)
+    data = analyzeCleaningFunction(removeDuplicateID, data)
 
-data = removeUnusableColumns(data)
+    data = removeUnusableColumns(data)
 
-data = analyzeCleaningFunction(removeFakeDates, data)
+    data = analyzeCleaningFunction(removeFakeDates, data)
 
-data = analyzeCleaningFunction(removeOldFilms, data)
+    data = analyzeCleaningFunction(removeOldFilms, data)
 
-data = analyzeCleaningFunction(removeNonFeatureFilms, data)
+    data = analyzeCleaningFunction(removeNonFeatureFilms, data)
 
-data = analyzeCleaningFunction(removeNoIMDBID, data)
+    data = analyzeCleaningFunction(removeNoIMDBID, data)
 
-#save the data to a new CSV
-data.to_csv("cleanedData.csv", index = False)
+    #save the data to a new CSV
+    data.to_csv("cleanedData.csv", index = False)
 
-#Data Analysis
-numNoID = data['id'].isnull().sum() + (data['id'] == '').sum()
-numNoTitle = data['title'].isnull().sum() + (data['title'] == '').sum()
-numNoIMDBID = data['imdb_id'].isnull().sum() + (data['imdb_id'] == '').sum()
-numNoGenre = data['genres'].isnull().sum() + (data['genres'] == '').sum()
-numNoKeyWords = data['keywords'].isnull().sum() + (data['keywords'] == '').sum()
+    #Data Analysis
+    numNoID = data['id'].isnull().sum() + (data['id'] == '').sum()
+    numNoTitle = data['title'].isnull().sum() + (data['title'] == '').sum()
+    numNoIMDBID = data['imdb_id'].isnull().sum() + (data['imdb_id'] == '').sum()
+    numNoGenre = data['genres'].isnull().sum() + (data['genres'] == '').sum()
+    numNoKeyWords = data['keywords'].isnull().sum() + (data['keywords'] == '').sum()
 
-# Print the results
-print(f"Number of missing 'id' or empty: {numNoID}")
-print(f"Number of missing 'title' or empty: {numNoTitle}")
-print(f"Number of missing 'imdb_id' or empty: {numNoIMDBID}")
-print(f"Number of missing 'genres' or empty: {numNoGenre}")
-print(f"Number of missing 'keywords' or empty: {numNoKeyWords}")
+    # Print the results
+    print(f"Number of missing 'id' or empty: {numNoID}")
+    print(f"Number of missing 'title' or empty: {numNoTitle}")
+    print(f"Number of missing 'imdb_id' or empty: {numNoIMDBID}")
+    print(f"Number of missing 'genres' or empty: {numNoGenre}")
+    print(f"Number of missing 'keywords' or empty: {numNoKeyWords}")
 
 
@@ -0,0 +1,167 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+from CodeCleaning import (removeUnreleased, removeFutureRelease, removePorn, removeUnusableColumns,
+                          removeFakeDates, removeOldFilms, removeNonFeatureFilms, removeNoIMDBID)
+
+'''
+    Streaming version of CodeCleaning.py for dumps that do not fit in memory.
+
+    Every chunk of the dump goes through all row-local filters before the next chunk is read, and
+    only the chunk is ever copied. The two global steps are replaced:
+    - removeDuplicateID keeps the first row of every id, so a compact set of the ids seen so far
+      is enough to drop the later rows chunk by chunk.
+    - removeDuplicates drops exact duplicate rows. Those share their id and get the same result from
+      every filter, so the id dedup already drops them and the step is not needed.
+    The filters run in the same order as in CodeCleaning.py, so the output file is the same.
+
+    This takes two passes over the dump, not one. A full read types an integer column as float if
+    any row lacks a value, which a chunk can only know once every chunk has been seen, and the chunks
+    written before that would be formatted differently. inferColumnTypes() therefore reads the dump
+    once first, parsing only the columns that are numeric in the first chunk, the only ones whose
+    type can still change.
+'''
+
+#Filters before and after removeDuplicateID, in the order CodeCleaning.py runs them
+filtersBeforeIDs = [removeUnreleased, removeFutureRelease, removePorn]
+filtersAfterIDs = [removeFakeDates, removeOldFilms, removeNonFeatureFilms, removeNoIMDBID]
+
+
+#Set of seen ids: a bitmap for non-negative integer ids, a Python set for anything else
+class SeenIDs:
+    def __init__(self, capacity=1 << 21):
+        self.bits = np.zeros(capacity // 8, dtype=np.uint8)
+        self.other = set()
+
+    def size(self):
+        return int(np.unpackbits(self.bits).sum()) + len(self.other)
+
+    def splitIDs(self, ids):
+        #integer positions of bitmap ids, and the mask of ids kept in the set
+        values = ids.to_numpy()
+        if values.dtype.kind in 'iuf':
+            values = values.astype(np.float64)
+            integral = np.isfinite(values) & (values >= 0) & (values < 1 << 32) & (values == np.floor(values))
+        else:
+            integral = np.zeros(len(values), dtype=bool)
+        positions = values[integral].astype(np.int64) if integral.any() else np.zeros(0, dtype=np.int64)
+        return positions, integral
+
+    def growTo(self, position):
+        if position >= len(self.bits) * 8:
+            newSize = max(len(self.bits) * 2, position // 8 + 1)
+            self.bits = np.concatenate([self.bits, np.zeros(newSize - len(self.bits), dtype=np.uint8)])
+
+    def keepFirstUnseen(self, ids):
+        """
+        Mark the first occurrence of every id not seen before, and remember those ids.
+
+        :param ids: Series of ids, in dataset order
+        :return: Boolean array, True for the rows to keep
+        """
+        keep = ~ids.duplicated(keep='first').to_numpy()
+
+        positions, integral = self.splitIDs(ids)
+        if len(positions):
+            self.growTo(positions.max())
+            seen = (self.bits[positions >> 3] >> (positions & 7).astype(np.uint8)) & 1
+            integralKeep = keep[integral] & (seen == 0)
+            keep[integral] = integralKeep
+            added = positions[integralKeep]
+            np.bitwise_or.at(self.bits, added >> 3, (1 << (added & 7)).astype(np.uint8))
+
+        for row in np.flatnonzero(~integral & keep):
+            #drop_duplicates treats NaN ids as equal, so they share one key
+            key = ids.iat[row]
+            if pd.isnull(key):
+                key = 'nan'
+            if key in self.other:
+                keep[row] = False
+            else:
+                self.other.add(key)
+        return keep
+
+
+#Column dtypes as a full read would infer them, so every chunk is parsed and written the same way
+def inferColumnTypes(fileLocation, chunkSize, nrows=None):
+    #text in the first chunk stays text, only the numeric columns have to be checked in every chunk
+    first = pd.read_csv(fileLocation, nrows=chunkSize if nrows is None else min(chunkSize, nrows))
+    numeric = [column for column, dtype in first.dtypes.items() if dtype.kind in 'iuf']
+    if not numeric:
+        return {}
+
+    kinds = {}
+    for chunk in pd.read_csv(fileLocation, chunksize=chunkSize, nrows=nrows, usecols=numeric):
+        for column, dtype in chunk.dtypes.items():
+            kinds.setdefault(column, set()).add(dtype.kind)
+
+    #integer chunks next to float chunks (e.g. chunks with NaN) become float in a full read
+    return {column: 'float64' for column, columnKinds in kinds.items()
+            if columnKinds <= {'i', 'u', 'f'} and 'f' in columnKinds}
+
+
+def applyFilters(filters, data, removed):
+    for func in filters:
+        beforeLength = len(data)
+        data = func(data)
+        removed[func.__name__] += beforeLength - len(data)
+    return data
+
+
+def cleanStream(fileLocation, destination, chunkSize=100000, nrows=None):
+    """
+    Clean a TMDB dump chunk by chunk, writing the same file as CodeCleaning.py.
+
+    :param fileLocation: Path of the TMDB dump
+    :param destination: Path of the cleaned CSV file
+    :param chunkSize: Rows read at a time, peak memory grows with it rather than with the dump
+    :param nrows: Only clean the first nrows rows, None for the whole dump
+    :return: Number of movies written
+    """
+    dtypes = inferColumnTypes(fileLocation, chunkSize, nrows)
+    seen = SeenIDs()
+    stepNames = [func.__name__ for func in filtersBeforeIDs] + ['removeDuplicateID'] + \
+                [func.__name__ for func in filtersAfterIDs]
+    removed = dict.fromkeys(stepNames, 0)
+    totalRows = 0
+    written = 0
+    header = True
+    tempDestination = destination + ".tmp"
+
+    for chunk in pd.read_csv(fileLocation, chunksize=chunkSize, nrows=nrows, dtype=dtypes):
+        totalRows += len(chunk)
+        chunk = applyFilters(filtersBeforeIDs, chunk, removed)
+
+        beforeLength = len(chunk)
+        chunk = chunk[seen.keepFirstUnseen(chunk['id'])]
+        removed['removeDuplicateID'] += beforeLength - len(chunk)
+
+        chunk = removeUnusableColumns(chunk)
+        chunk = applyFilters(filtersAfterIDs, chunk, removed)
+
+        chunk.to_csv(tempDestination, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        written += len(chunk)
+
+    os.replace(tempDestination, destination)
+
+    for name, count in removed.items():
+        print(f"Removed {count} movies with function {name}.")
+    print(f"Kept {written} of {totalRows} movies, {seen.size()} distinct ids seen.")
+    return written
+
+
+if __name__ == "__main__":
+    #USER OPTIONS:
+    useFullDataSet = True
+    numberOfRows = 100000
+    chunkSize = 100000
+
+    #Set file location
+    file_location = "TMDB_movie_dataset_v11.csv"
+    cleaned_destination = "cleanedData.csv"
+
+    start = time.time()
+    cleanStream(file_location, cleaned_destination, chunkSize, None if useFullDataSet else numberOfRows)
+    print(f"Took {time.time() - start:.2f} seconds")
@@ -1,62 +1,77 @@
-from scipy.spatial.distance import euclidean
-import pandas as pd
 import sys
 import warnings
+from movie_search import search_vector
+from feature_store import load_movies
+from title_index import build_title_index, lookup_movie, describe_candidate
+from ann_index import load_ivf_indexes, search_ivf
 
 
-def find_similar_movies_by_genre(movie, df, k=10):
-    movie_cluster = df.loc[df['title'] == movie, 'genre_cluster'].iloc[0]
-    combined_genres_input = df.loc[df['title'] == movie, 'combined_genres'].iloc[0]
-    clustered_movies = df[df['genre_cluster'] == movie_cluster]
-    clustered_movies['distance'] = clustered_movies['combined_genres'].apply(
-        lambda x: euclidean(combined_genres_input, x)
-    )
-    similar_movies = clustered_movies.nsmallest(k, 'distance')
-    return similar_movies[['title', 'distance']]
+def find_similar_to_vector(query, df, matrices, mode, k=10, indexes=None, nprobe=None):
+    # nearest movies to an encoded query, e.g. free text projected through the model artifacts
+    if indexes and mode in indexes:
+        nearest, distances = search_ivf(indexes[mode], query, k, nprobe)
+    else:
+        nearest, distances = search_vector(matrices[mode], query, k)
+    # nearest holds row positions, so the ids are taken positionally too, whatever df's index is
+    similar_movies = df[['title']].iloc[nearest].copy()
+    similar_movies['imdb_id'] = df['imdb_id'].iloc[nearest].to_numpy()
+    similar_movies['distance'] = distances
+    return similar_movies
 
 
-def find_similar_movies_by_summary(movie, df, k=10):
-    movie_cluster = df.loc[df['title'] == movie, 'overview_cluster'].iloc[0]
-    combined_summary_input = df.loc[df['title'] == movie, 'embedded_overview'].iloc[0]
-    cluster_movies = df[df['overview_cluster'] == movie_cluster]
-    cluster_movies['distance'] = cluster_movies['embedded_overview'].apply(
-        lambda x: euclidean(combined_summary_input, x)
-    )
-    similar_movies = cluster_movies.nsmallest(k, 'distance')
-    return similar_movies[['title', "distance"]]
+def find_similar_movies(row, df, matrices, mode, k=10, indexes=None, nprobe=None):
+    return find_similar_to_vector(matrices[mode]['vectors'][row], df, matrices, mode, k, indexes, nprobe)
 
 
-def find_similar_movies_by_keywords(movie, df, k=10):
-    movie_cluster = df.loc[df['title'] == movie, 'keyword_cluster'].iloc[0]
-    combined_keyword_input = df.loc[df['title'] == movie, 'combined_keywords'].iloc[0]
-    cluster_movies = df[df['keyword_cluster'] == movie_cluster]
-    cluster_movies['distance'] = cluster_movies['combined_keywords'].apply(
-        lambda x: euclidean(combined_keyword_input, x)
-    )
-    similar_movies = cluster_movies.nsmallest(k, 'distance')
-    return similar_movies[['title', 'distance']]
+def find_similar_movies_by_genre(row, df, matrices, k=10, indexes=None):
+    return find_similar_movies(row, df, matrices, 'genre', k, indexes)
+
+
+def find_similar_movies_by_summary(row, df, matrices, k=10, indexes=None):
+    return find_similar_movies(row, df, matrices, 'summary', k, indexes)
+
+
+def find_similar_movies_by_keywords(row, df, matrices, k=10, indexes=None):
+    return find_similar_movies(row, df, matrices, 'keywords', k, indexes)
+
+
+def choose_candidate(df, title_index, rows):
+    # several movies share the title, let the user pick by year / IMDb ID
+    print("Multiple movies match that title:")
+    for number, row in enumerate(rows, start=1):
+        print(f"  {number}. {describe_candidate(df, title_index, row)}")
+    choice = input("Enter the number of the movie: ")
+    if not choice.isdigit() or not 1 <= int(choice) <= len(rows):
+        print(f"Invalid choice '{choice}'!")
+        sys.exit(1)
+    return rows[int(choice) - 1]
 
 
 def main():
     warnings.filterwarnings("ignore")
     file_name = "movie_pickle.pkl"
-    df = pd.read_pickle(file_name)
+    store_dir = "feature_store"
+    df, matrices = load_movies(file_name, store_dir)
+    title_index = build_title_index(df)
+    indexes = load_ivf_indexes(".", df['imdb_id'])
 
-    movie_name = input("Enter the name of the movie: ")
-    if movie_name not in df['title'].values:
+    movie_name = input("Enter the name or IMDb ID of the movie: ")
+    rows = lookup_movie(title_index, movie_name)
+    if not rows:
         print(f"Movie '{movie_name}' not found in the dataset!")
         sys.exit(1)
+    row = rows[0] if len(rows) == 1 else choose_candidate(df, title_index, rows)
 
     search_by = input("What do you want to search by: Genre, Summary, or Keywords? ")
 
     if search_by.lower() == "genre":
-        similar_movies = find_similar_movies_by_genre(movie_name, df)
+        similar_movies = find_similar_movies_by_genre(row, df, matrices, indexes=indexes)
         print(similar_movies)
     elif search_by.lower() == "summary":
-        similar_movies = find_similar_movies_by_summary(movie_name, df)
+        similar_movies = find_similar_movies_by_summary(row, df, matrices, indexes=indexes)
         print(similar_movies)
     elif search_by.lower() == "keywords":
-        similar_movies = find_similar_movies_by_keywords(movie_name, df)
+        similar_movies = find_similar_movies_by_keywords(row, df, matrices, indexes=indexes)
         print(similar_movies)
 
 
@@ -0,0 +1,193 @@
+import asyncio
+import time
+import aiohttp
+import pandas as pd
+from imdb_parsers import IMDB_BASE_URL, page_url, parse_pages, plan_pages
+
+# asyncio scraping core: one pooled aiohttp session fetches the pages of many movies concurrently,
+# and a single rate limiter shared by every request keeps the aggregate rate polite.
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 6.3; Win 64 ; x64) Apple WeKit /537.36(KHTML , like Gecko) Chrome/80.0.3987.162 Safari/537.36'
+}
+RETRY_STATUSES = (500, 502, 504, 429, 403)
+
+
+class RateLimiter:
+    # token bucket allowing `rate` requests per second with bursts of up to `burst`
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def fetch_page(session, limiter, url, retries=5, backoff_factor=0.5):
+    """
+    Fetch one page, retrying throttling and server errors with exponential backoff.
+
+    :return: Page HTML, or None if it could not be retrieved
+    """
+    error = None
+    for attempt in range(retries + 1):
+        await limiter.acquire()
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return await response.text()
+                if response.status not in RETRY_STATUSES:
+                    print(f"Warning: Status code {response.status} for {url}")
+                    return None
+                error = f"status {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = repr(e)
+
+        if attempt < retries:
+            await asyncio.sleep(backoff_factor * 2 ** attempt)
+
+    print(f"Request error for {url}: {error}")
+    return None
+
+
+async def scrape_movie(session, limiter, imdb_id, pages, base_url=IMDB_BASE_URL, cache=None):
+    """
+    Fetch the given pages of one movie concurrently and parse them.
+
+    :param pages: Page types to fetch, see imdb_parsers.PAGE_PATHS
+    :param cache: Optional PageCache consulted before the network
+    :return: Dict of scraped columns, or None if no page could be retrieved
+    """
+    fetched = cache.get_pages(imdb_id, pages) if cache else {}
+    pages = [page for page in pages if page not in fetched]
+    texts = await asyncio.gather(*(fetch_page(session, limiter, page_url(imdb_id, page, base_url))
+                                   for page in pages))
+    for page, text in zip(pages, texts):
+        if text is not None:
+            fetched[page] = text
+            if cache:
+                cache.put(imdb_id, page, text)
+    if not fetched:
+        print(f"Failed to retrieve any page for {imdb_id}")
+        return None
+
+    try:
+        return parse_pages(fetched)
+    except Exception as e:
+        print(f"Couldn't parse {imdb_id}: {e}")
+        return None
+
+
+async def scrape_movies(jobs, concurrency=32, rate=5.0, base_url=IMDB_BASE_URL, limiter=None, timeout=10,
+                        cache=None):
+    """
+    Scrape many movies over one pooled connection set.
+
+    :param jobs: Iterable of (imdb_id, pages) pairs
+    :param concurrency: Number of movies in flight and size of the connection pool
+    :param rate: Global requests per second when no limiter is given
+    :param base_url: IMDb base URL, can point at a local stub server
+    :param limiter: Shared limiter with an async acquire(), defaults to RateLimiter(rate)
+    :param timeout: Per-request timeout in seconds
+    :param cache: Optional PageCache consulted before the network
+    :return: Dict of imdb_id -> scraped columns (None on failure)
+    """
+    limiter = limiter or RateLimiter(rate)
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    total = queue.qsize()
+    results = {}
+
+    async def worker(session):
+        while True:
+            try:
+                imdb_id, pages = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results[imdb_id] = await scrape_movie(session, limiter, imdb_id, pages, base_url, cache)
+            if len(results) % 100 == 0:
+                print(f"Scraped {len(results)}/{total} movies")
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout, headers=HEADERS) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+    return results
+
+
+async def scrape_rounds(df_subset, jobs, **kwargs):
+    # both rounds run in one event loop, so a limiter (and its asyncio.Lock) is only ever used by one loop
+    if kwargs.get('limiter') is None:
+        kwargs['limiter'] = RateLimiter(kwargs.pop('rate', 5.0))
+    results = await scrape_movies(jobs.values(), **kwargs)
+
+    # second round: the other pages, only for columns the main page did not have
+    followups = {}
+    for index, (imdb_id, pages) in jobs.items():
+        found = results.get(imdb_id) or {}
+        followup = [page for page in plan_pages(df_subset.loc[index], found=found) if page not in pages]
+        if followup:
+            followups[index] = (imdb_id, followup)
+    if followups:
+        print(f"Fetching follow-up pages for {len(followups)} movies")
+        for imdb_id, movie_data in (await scrape_movies(followups.values(), **kwargs)).items():
+            if movie_data:
+                results[imdb_id] = {**(results.get(imdb_id) or {}), **movie_data}
+    return results
+
+
+def update_movie_dataset(input_file, **kwargs):
+    """
+    Scrape the missing columns of a range of rows and return the updated rows.
+
+    :param input_file: Path to the input CSV file
+    :param kwargs: start_line, end_line (inclusive) and any scrape_movies() option
+    :return: DataFrame with the updated rows of the range
+    """
+    df = pd.read_csv(input_file)
+    start_line = kwargs.pop('start_line', 0)
+    end_line = kwargs.pop('end_line', len(df) - 1)
+    df_subset = df.iloc[start_line:end_line + 1].copy()
+
+    # first round: the main page alone, whose embedded JSON can fill every column
+    jobs = {}
+    for index, movie in df_subset.iterrows():
+        pages = plan_pages(movie, use_json=True)
+        if pages:
+            jobs[index] = (movie['imdb_id'], pages)
+
+    print(f"Processing from movie {start_line} to movie {end_line}: {len(jobs)} movies need scraping")
+    results = asyncio.run(scrape_rounds(df_subset, jobs, **kwargs))
+    for index, (imdb_id, pages) in jobs.items():
+        movie_data = results.get(imdb_id)
+        if not movie_data:
+            print(f"Skipping movie {imdb_id} due to scraping failure")
+            continue
+        for column, value in movie_data.items():
+            if column in df_subset.columns and pd.isnull(df_subset.at[index, column]):
+                df_subset.at[index, column] = value
+
+    return df_subset
+
+
+if __name__ == "__main__":
+    input_file = '../Datasets/clean.csv'
+    start_line = 100
+    end_line = 200  # inclusive
+    start = time.time()
+    output = update_movie_dataset(input_file, start_line=start_line, end_line=end_line, concurrency=32, rate=5.0)
+    output.to_csv(f'../Datasets/scraped_{start_line}_{end_line}.csv', index=False)
+    print(f"Took {time.time() - start} seconds to process {end_line - start_line + 1} movies")
@@ -0,0 +1,77 @@
+import glob
+import os
+import time
+import pandas as pd
+
+# Delta checkpoints: a scraper appends only the rows it changed (imdb_id + updated columns) to a delta
+# CSV instead of re-writing the whole dataset at every checkpoint. merge_deltas() later applies every
+# delta to the base dataset in one vectorized pass.
+
+
+def append_delta(delta_file, updates):
+    """
+    Append changed rows to a delta file.
+
+    :param delta_file: CSV the changes are appended to, created with a header if missing
+    :param updates: List of dicts holding 'imdb_id' and the updated columns
+    :return: Number of rows written
+    """
+    if not updates:
+        return 0
+    pd.DataFrame(updates).to_csv(delta_file, mode='a', header=not os.path.exists(delta_file), index=False)
+    return len(updates)
+
+
+def load_deltas(delta_files):
+    # one row per imdb_id; later files and later rows win
+    frames = [pd.read_csv(delta_file) for delta_file in delta_files]
+    if not frames:
+        return pd.DataFrame(columns=['imdb_id'])
+    deltas = pd.concat(frames, ignore_index=True)
+    return deltas.drop_duplicates('imdb_id', keep='last').set_index('imdb_id')
+
+
+def apply_deltas(df, deltas, overwrite=False):
+    """
+    Apply loaded deltas to a DataFrame.
+
+    :param df: Base DataFrame with an imdb_id column
+    :param deltas: DataFrame indexed by imdb_id, from load_deltas()
+    :param overwrite: Replace existing values instead of only filling nulls
+    :return: Updated copy of df
+    """
+    df = df.copy()
+    for column in deltas.columns:
+        if column not in df.columns:
+            continue
+        updates = df['imdb_id'].map(deltas[column])
+        if overwrite:
+            df[column] = updates.combine_first(df[column])
+        else:
+            df[column] = df[column].fillna(updates)
+    return df
+
+
+def merge_deltas(base_file, delta_pattern, output_file, overwrite=False):
+    """
+    Apply every delta file matching a glob pattern to the base dataset and save the result.
+
+    :param base_file: Path to the base dataset CSV file
+    :param delta_pattern: Glob pattern of the delta files, applied in sorted order
+    :param output_file: Path of the merged CSV file
+    :param overwrite: Replace existing values instead of only filling nulls
+    """
+    delta_files = sorted(glob.glob(delta_pattern))
+    deltas = load_deltas(delta_files)
+    df = apply_deltas(pd.read_csv(base_file), deltas, overwrite)
+    df.to_csv(output_file, index=False)
+    print(f"Applied {len(deltas)} changed movies from {len(delta_files)} delta files to {output_file}")
+
+
+if __name__ == "__main__":
+    base_file = '../Datasets/clean.csv'
+    delta_pattern = '../Datasets/Scraped_Chunks/*_delta.csv'
+    output_file = '../Datasets/clean_merged.csv'
+    start = time.time()
+    merge_deltas(base_file, delta_pattern, output_file)
+    print(f"Took {time.time() - start:.2f} seconds")
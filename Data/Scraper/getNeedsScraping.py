@@ -2,22 +2,102 @@ import pandas as pd
 import numpy as np
 from datetime import date
 import os
+from imdb_parsers import FIELD_PAGES, PAGE_FIELDS
+
+# Plans the scraping work for the whole dataset in one vectorized pass. Every movie gets a bitmask of
+# its missing scrapable fields, and from that the set of IMDb pages it needs. The scrapers read the
+# resulting queue instead of re-checking every column of every row.
 
 #Set Paths
 sourcePath = "cleanedData.csv"
 noGenrePath = "noGenre.csv"
+queuePath = "scrapeQueue.csv"
+
+#Bit i of a mask is set when SCRAPE_FIELDS[i] is missing
+SCRAPE_FIELDS = tuple(FIELD_PAGES)
+PAGE_MASKS = {page: sum(1 << SCRAPE_FIELDS.index(field) for field in fields) for page, fields in PAGE_FIELDS.items()}
+
+
+def missingFieldMask(data):
+    """
+    Bitmask of the missing scrapable fields of every row.
+
+    :param data: Dataset DataFrame, columns it does not have count as present
+    :return: uint16 array with one mask per row
+    """
+    mask = np.zeros(len(data), dtype=np.uint16)
+    for bit, field in enumerate(SCRAPE_FIELDS):
+        if field in data.columns:
+            missing = (data[field].isnull() | (data[field] == '')).to_numpy()
+            mask |= missing.astype(np.uint16) << np.uint16(bit)
+    return mask
+
+
+def maskFields(mask):
+    #field names of a single mask
+    return [field for bit, field in enumerate(SCRAPE_FIELDS) if mask & (1 << bit)]
+
+
+def buildWorkQueue(data):
+    """
+    Prioritized scraping queue of every row with a missing field, grouped by the pages it needs.
+
+    Groups needing fewer pages come first, and within a group the rows missing the most fields.
+
+    :param data: Dataset DataFrame
+    :return: DataFrame of row (position in data), imdb_id, mask, missingCount, pages ("main|keywords") and pageCount
+    """
+    mask = missingFieldMask(data)
+    needed = np.flatnonzero(mask)
+    mask = mask[needed]
+
+    pageNeeded = np.column_stack([(mask & pageMask) != 0 for pageMask in PAGE_MASKS.values()])
+    pageNames = np.array(list(PAGE_MASKS), dtype=object)
+    pages = ['|'.join(pageNames[row]) for row in pageNeeded]
+    missingCount = np.unpackbits(mask.view(np.uint8).reshape(-1, 2), axis=1).sum(axis=1)
+
+    queue = pd.DataFrame({
+        'row': needed,
+        'imdb_id': data['imdb_id'].to_numpy()[needed],
+        'mask': mask,
+        'missingCount': missingCount,
+        'pages': pages,
+        'pageCount': pageNeeded.sum(axis=1),
+    })
+    return queue.sort_values(['pageCount', 'pages', 'missingCount', 'row'],
+                             ascending=[True, True, False, True], kind='stable', ignore_index=True)
+
+
+def loadWorkQueue(queuePath, startLine=None, endLine=None):
+    #queue rows inside an optional inclusive range of dataset rows, in queue order
+    queue = pd.read_csv(queuePath)
+    if startLine is not None:
+        queue = queue[queue['row'] >= startLine]
+    if endLine is not None:
+        queue = queue[queue['row'] <= endLine]
+    return queue
+
+
+if __name__ == "__main__":
+    #Delete data needing scraping if it already exists
+    for path in (noGenrePath, queuePath):
+        if os.path.exists(path):
+            # Delete the file
+            os.remove(path)
+            print(f"{path} has been deleted.")
+        else:
+            print(f"{path} does not exist.")
 
-#Delete data needing scraping if it already exists
-if os.path.exists(noGenrePath):
-    # Delete the file
-    os.remove(noGenrePath)
-    print(f"{noGenrePath} has been deleted.")
-else:
-    print(f"{noGenrePath} does not exist.")
+    #load input data
+    data = pd.read_csv(sourcePath)
 
-#load input data
-data = pd.read_csv(sourcePath)
+    #get data without genre defined and create a new csv
+    noGenre = data[data['genres'].isnull() | (data['genres'] == '')]
+    noGenre.to_csv(noGenrePath, index = False)
 
-#get data without genre defined and create a new csv
-noGenre = data[data['genres'].isnull() | (data['genres'] == '')]
-noGenre.to_csv("noGenre.csv", index = False)
\ No newline at end of file
+    #plan every missing field and save the work queue
+    queue = buildWorkQueue(data)
+    queue.to_csv(queuePath, index = False)
+    print(f"{len(queue)} of {len(data)} movies need scraping, {queue['pageCount'].sum()} page fetches")
+    for pages, group in queue.groupby('pages', sort=False):
+        print(f"    {pages}: {len(group)} movies")
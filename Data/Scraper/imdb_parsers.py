@@ -0,0 +1,329 @@
+import json
+import re
+from html import unescape
+import pandas as pd
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Page parsers shared by the scrapers. Each parser takes the HTML of one IMDb page and returns
+# a dict with the dataset columns it found; columns it could not find are left out.
+#
+# Extraction is written once against CSS selectors and runs on a pluggable backend:
+#   'html.parser'  BeautifulSoup full-document parse (the original scraper behaviour)
+#   'strainer'     BeautifulSoup parsing only the subtrees the selectors need, with lxml if installed
+#   'selectolax'   selectolax's Lexbor HTML parser, if installed
+#
+# html.parser stays the default until parser_benchmark.py shows the faster backends produce the
+# same output as the legacy parsers on real saved pages (the committed fixtures are modelled on IMDb's
+# markup, not saved from it); pass backend= to opt in to them. Every scraper parses through here.
+#
+# The main page also embeds its data as JSON (__NEXT_DATA__ and ld+json). parse_main_page_json()
+# reads every column from that blob with one regex scan and no DOM build, falling back to the
+# DOM parsers for whatever the blob is missing.
+
+IMDB_BASE_URL = "https://www.imdb.com"
+
+# path of every page relative to /title/<imdb_id>/
+PAGE_PATHS = {
+    'main': "",
+    'summary': "plotsummary/",
+    'tagline': "taglines/",
+    'keywords': "keywords/",
+}
+
+# dataset columns each page provides
+PAGE_FIELDS = {
+    'main': ('genres', 'runtime', 'spoken_languages', 'production_companies', 'production_countries'),
+    'summary': ('overview',),
+    'tagline': ('tagline',),
+    'keywords': ('keywords',),
+}
+
+FIELD_PAGES = {field: page for page, fields in PAGE_FIELDS.items() for field in fields}
+
+
+def page_url(imdb_id, page, base_url=IMDB_BASE_URL):
+    return f"{base_url}/title/{imdb_id}/{PAGE_PATHS[page]}"
+
+
+def plan_pages(movie, found=(), use_json=False):
+    """
+    Smallest set of pages covering every null scrapable column of a dataset row.
+
+    :param movie: Dataset row
+    :param found: Columns already scraped, e.g. from a first round of pages
+    :param use_json: Plan for the embedded JSON mode, where the main page alone can provide every column
+    :return: List of page types
+    """
+    missing = [field for field in FIELD_PAGES if field in movie and pd.isnull(movie[field]) and field not in found]
+    if use_json and missing:
+        return ['main']
+    return [page for page, fields in PAGE_FIELDS.items() if any(field in missing for field in fields)]
+
+
+def parse_runtime_to_minutes(runtime_text):
+    hours_match = re.search(r'(\d+)hours?', runtime_text)
+    minutes_match = re.search(r'(\d+)minutes?', runtime_text)
+
+    total_minutes = 0
+    if hours_match:
+        total_minutes += int(hours_match.group(1)) * 60
+    if minutes_match:
+        total_minutes += int(minutes_match.group(1))
+
+    return total_minutes if total_minutes > 0 else None
+
+
+# CSS selectors for every page type
+SELECTORS = {
+    'main': {
+        'genres_scroller': 'div.ipc-chip-list__scroller',
+        'genres': 'a.ipc-chip span.ipc-chip__text',
+        'runtime': 'li[data-testid="title-techspec_runtime"] div.ipc-metadata-list-item__content-container',
+        'spoken_languages': 'li[data-testid="title-details-languages"] a.ipc-metadata-list-item__list-content-item',
+        'production_companies': 'li[data-testid="title-details-companies"] a.ipc-metadata-list-item__list-content-item',
+        'production_countries': 'li[data-testid="title-details-origin"] a.ipc-metadata-list-item__list-content-item',
+    },
+    'summary': {
+        'overview': 'li[id^="po"] div.ipc-html-content-inner-div',
+    },
+    'tagline': {
+        # data-testid and ipc-* names are stable; the hashed sc-* classes change with every IMDb deploy
+        'tagline': '[data-testid^="sub-section"] ul.ipc-metadata-list li.ipc-metadata-list__item '
+                   'div.ipc-html-content-inner-div',
+    },
+    'keywords': {
+        'list': 'ul[class*="ipc-metadata-list"]',
+        'items': 'li[class*="ipc-metadata-list-summary-item"]',
+        'keyword': 'a[class*="ipc-metadata-list-summary-item__t"]',
+    },
+}
+
+# subtrees the 'strainer' backend keeps for every page type; everything else is skipped while parsing
+STRAINERS = {
+    'main': SoupStrainer(attrs={'data-testid': True}),
+    'summary': SoupStrainer('li', id=re.compile('^po')),
+    'tagline': SoupStrainer(attrs={'data-testid': re.compile('^sub-section')}),
+    'keywords': SoupStrainer('ul', class_=lambda x: x and 'ipc-metadata-list' in x),
+}
+
+
+def soup_backend(parse):
+    return {
+        'parse': parse,
+        'select': lambda node, css: node.select(css),
+        'select_one': lambda node, css: node.select_one(css),
+        'text': lambda node: node.get_text(strip=True),
+    }
+
+
+BACKENDS = {
+    'html.parser': soup_backend(lambda html, page: BeautifulSoup(html, 'html.parser')),
+    'strainer': soup_backend(lambda html, page: BeautifulSoup(html, 'lxml' if lxml else 'html.parser',
+                                                              parse_only=STRAINERS[page])),
+}
+if LexborHTMLParser is not None:
+    BACKENDS['selectolax'] = {
+        'parse': lambda html, page: LexborHTMLParser(html),
+        'select': lambda node, css: node.css(css),
+        'select_one': lambda node, css: node.css_first(css),
+        'text': lambda node: node.text(deep=True, separator='', strip=True),
+    }
+
+DEFAULT_BACKEND = 'html.parser'
+
+
+def joined_text(backend, root, css):
+    items = [backend['text'](node) for node in backend['select'](root, css)]
+    return ', '.join(item for item in items if item)
+
+
+def parse_main_page(html, backend=DEFAULT_BACKEND):
+    backend = BACKENDS[backend]
+    selectors = SELECTORS['main']
+    root = backend['parse'](html, 'main')
+    movie_data = {}
+
+    genres_scroller = backend['select_one'](root, selectors['genres_scroller'])
+    if genres_scroller is not None:
+        genres = joined_text(backend, genres_scroller, selectors['genres'])
+        if genres:
+            movie_data['genres'] = genres
+
+    runtime_element = backend['select_one'](root, selectors['runtime'])
+    if runtime_element is not None:
+        runtime_text = backend['text'](runtime_element)
+        runtime_minutes = parse_runtime_to_minutes(runtime_text) if runtime_text else None
+        if runtime_minutes:
+            movie_data['runtime'] = runtime_minutes
+
+    for column in ('spoken_languages', 'production_companies', 'production_countries'):
+        items = joined_text(backend, root, selectors[column])
+        if items:
+            movie_data[column] = items
+
+    return movie_data
+
+
+def parse_summary_page(html, backend=DEFAULT_BACKEND):
+    backend = BACKENDS[backend]
+    plot_div = backend['select_one'](backend['parse'](html, 'summary'), SELECTORS['summary']['overview'])
+    return {'overview': backend['text'](plot_div)} if plot_div is not None else {}
+
+
+def parse_tagline_page(html, backend=DEFAULT_BACKEND):
+    backend = BACKENDS[backend]
+    tagline_div = backend['select_one'](backend['parse'](html, 'tagline'), SELECTORS['tagline']['tagline'])
+    return {'tagline': backend['text'](tagline_div)} if tagline_div is not None else {}
+
+
+def parse_keywords_page(html, backend=DEFAULT_BACKEND, limit=15):
+    backend = BACKENDS[backend]
+    selectors = SELECTORS['keywords']
+    keywords_ul = backend['select_one'](backend['parse'](html, 'keywords'), selectors['list'])
+    if keywords_ul is None:
+        return {}
+
+    keywords = []
+    for keyword_li in backend['select'](keywords_ul, selectors['items'])[:limit]:
+        keyword_a = backend['select_one'](keyword_li, selectors['keyword'])
+        if keyword_a is not None:
+            keywords.append(backend['text'](keyword_a))
+    return {'keywords': ', '.join(keywords)} if keywords else {}
+
+
+NEXT_DATA_PATTERN = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+LD_JSON_PATTERN = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+ISO_DURATION_PATTERN = re.compile(r'^PT(?:(\d+)H)?(?:(\d+)M)?')
+
+
+def dig(data, *keys):
+    # nested lookup that returns None instead of raising when the blob's shape changes
+    for key in keys:
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and isinstance(key, int) and -len(data) <= key < len(data):
+            data = data[key]
+        else:
+            return None
+    return data
+
+
+def texts(items, *keys):
+    return [text for text in (dig(item, *keys) for item in items or []) if isinstance(text, str) and text]
+
+
+def load_embedded_json(html):
+    # the __NEXT_DATA__ and ld+json blobs of a page, either None if missing or malformed
+    blobs = []
+    for pattern in (NEXT_DATA_PATTERN, LD_JSON_PATTERN):
+        match = pattern.search(html)
+        try:
+            blobs.append(json.loads(match.group(1)) if match else None)
+        except ValueError:
+            blobs.append(None)
+    return blobs
+
+
+def parse_embedded_json(html, keyword_limit=15):
+    """
+    Read the dataset columns from the JSON embedded in an IMDb main page.
+
+    :param html: Main page HTML
+    :param keyword_limit: Keywords to keep, matching parse_keywords_page()
+    :return: Dict of dataset column -> value, or None if the page has no JSON blob
+    """
+    next_data, ld_json = load_embedded_json(html)
+    if next_data is None and ld_json is None:
+        return None
+
+    above = dig(next_data, 'props', 'pageProps', 'aboveTheFoldData')
+    main = dig(next_data, 'props', 'pageProps', 'mainColumnData')
+    movie_data = {}
+
+    columns = {
+        'genres': texts(dig(above, 'genres', 'genres'), 'text'),
+        'spoken_languages': texts(dig(main, 'spokenLanguages', 'spokenLanguages'), 'text'),
+        'production_companies': texts(dig(main, 'production', 'edges'), 'node', 'company', 'companyText', 'text'),
+        'production_countries': texts(dig(main, 'countriesOfOrigin', 'countries')
+                                      or dig(above, 'countriesOfOrigin', 'countries'), 'text'),
+    }
+    for column, values in columns.items():
+        if values:
+            movie_data[column] = ', '.join(values)
+
+    runtime_seconds = dig(above, 'runtime', 'seconds')
+    if isinstance(runtime_seconds, int) and runtime_seconds >= 60:
+        movie_data['runtime'] = runtime_seconds // 60
+
+    overview = dig(above, 'plot', 'plotText', 'plainText')
+    if isinstance(overview, str) and overview:
+        movie_data['overview'] = overview
+
+    tagline = dig(main, 'taglines', 'edges', 0, 'node', 'text')
+    if isinstance(tagline, str) and tagline:
+        movie_data['tagline'] = tagline
+
+    # the main page only lists the first few keywords, keep them only if nothing is cut off
+    keywords = texts(dig(above, 'keywords', 'edges'), 'node', 'text')
+    keyword_total = dig(above, 'keywords', 'total')
+    if keywords and (len(keywords) >= keyword_limit or not isinstance(keyword_total, int)
+                     or keyword_total <= len(keywords)):
+        movie_data['keywords'] = ', '.join(keywords[:keyword_limit])
+
+    # ld+json covers a few columns when __NEXT_DATA__ is missing
+    if isinstance(ld_json, dict):
+        genres = ld_json.get('genre')
+        if 'genres' not in movie_data and genres:
+            movie_data['genres'] = genres if isinstance(genres, str) else ', '.join(genres)
+        duration = ISO_DURATION_PATTERN.match(ld_json.get('duration') or '')
+        if 'runtime' not in movie_data and duration and any(duration.groups()):
+            movie_data['runtime'] = int(duration.group(1) or 0) * 60 + int(duration.group(2) or 0)
+        if 'overview' not in movie_data and ld_json.get('description'):
+            movie_data['overview'] = unescape(ld_json['description'])
+
+    return movie_data
+
+
+def parse_main_page_json(html, backend=DEFAULT_BACKEND):
+    movie_data = parse_embedded_json(html)
+    if movie_data is None:
+        return parse_main_page(html, backend)
+    # DOM fallback only for main page columns the blob did not have
+    if any(field not in movie_data for field in PAGE_FIELDS['main']):
+        for column, value in parse_main_page(html, backend).items():
+            movie_data.setdefault(column, value)
+    return movie_data
+
+
+PAGE_PARSERS = {
+    'main': parse_main_page,
+    'summary': parse_summary_page,
+    'tagline': parse_tagline_page,
+    'keywords': parse_keywords_page,
+}
+
+
+def parse_pages(pages, backend=DEFAULT_BACKEND, use_json=True):
+    """
+    Run every page through its parser and merge the results.
+
+    :param pages: Dict of page type -> HTML text
+    :param backend: Extraction backend, one of BACKENDS
+    :param use_json: Read the main page from its embedded JSON, falling back to the DOM
+    :return: Dict of dataset column -> scraped value
+    """
+    movie_data = {}
+    for page, html in pages.items():
+        parser = parse_main_page_json if page == 'main' and use_json else PAGE_PARSERS[page]
+        movie_data.update(parser(html, backend))
+    return movie_data
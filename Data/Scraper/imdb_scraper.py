@@ -1,25 +1,14 @@
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-import re
 import requests
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 import time
 import random
-
-def parse_runtime_to_minutes(runtime_text):
-    # converting runtime to correct format
-    hours_match = re.search(r'(\d+)hours?', runtime_text)
-    minutes_match = re.search(r'(\d+)minutes?', runtime_text)
-    
-    total_minutes = 0
-    if hours_match:
-        total_minutes += int(hours_match.group(1)) * 60
-    if minutes_match:
-        total_minutes += int(minutes_match.group(1))
-    
-    return total_minutes if total_minutes > 0 else None
+import argparse
+from imdb_parsers import parse_pages
+from page_cache import PageCache
+from scrape_journal import ScrapeJournal
 
 def create_retry_session(
     retries=3,
@@ -54,7 +43,7 @@ def create_retry_session(
     
     return session
 
-def scrape_imdb_id(imdb_id):
+def scrape_imdb_id(imdb_id, cache=None):
     # allowing retries
     session = create_retry_session()
 
@@ -62,9 +51,6 @@ def scrape_imdb_id(imdb_id):
         'User-Agent': 'Mozilla/5.0 (Windows NT 6.3; Win 64 ; x64) Apple WeKit /537.36(KHTML , like Gecko) Chrome/80.0.3987.162 Safari/537.36'
     }
 
-    # add random timer so that imdb does not block ip from syrpassing rate limit
-    time.sleep(random.uniform(1, 3))
-
     def safe_request(url, session=session, headers=header):
         """
         Safely make a request with error handling and logging
@@ -87,138 +73,42 @@ def scrape_imdb_id(imdb_id):
         'keywords': f"https://www.imdb.com/title/{imdb_id}/keywords/"
     }
 
-    # getting html of each web page
+    # getting html of each web page, from the page cache when possible
     responses = {}
+    if cache:
+        responses = cache.get_pages(imdb_id, urls)
+
+    if len(responses) < len(urls):
+        # add random timer so that imdb does not block ip from syrpassing rate limit
+        time.sleep(random.uniform(1, 3))
+
     for key, url in urls.items():
+        if key in responses:
+            continue
         response = safe_request(url)
         if response is None:
             print(f"Failed to retrieve {key} page for {imdb_id}")
             return None
-        responses[key] = response
+        responses[key] = response.text
+        if cache:
+            cache.put(imdb_id, key, response.text)
 
-    movie_data = {}
-    
+    # the pages go through the shared parsers, on the backend configured in imdb_parsers.py
     try:
-        soup = BeautifulSoup(responses['main'].text, 'html.parser')
-        soup_keywords = BeautifulSoup(responses['keywords'].text, 'html.parser')
-
-        # scraping genres
-        genre_element = soup.find_all('div', class_='ipc-chip-list__scroller')
-        if genre_element:
-            genres_scroller = genre_element[0]
-            genres = [
-                genre.find('span', class_='ipc-chip__text').get_text(strip=True) 
-                for genre in genres_scroller.find_all('a', class_='ipc-chip')
-            ]
-            if genres:
-                movie_data['genres'] = ', '.join(genres)
-                print(f"New Genres: {', '.join(genres)}")
-            else:
-                print("Genres not found")
-
-        # scraping for movie runtime
-        runtime_element = soup.find('li', attrs={'data-testid': 'title-techspec_runtime'})
-        if runtime_element:
-            runtime_text = runtime_element.find('div', class_='ipc-metadata-list-item__content-container').get_text(strip=True)
-            if runtime_text:
-                runtime_minutes = parse_runtime_to_minutes(runtime_text)
-                if runtime_minutes:
-                    movie_data['runtime'] = runtime_minutes
-                    print(f"New Runtime: {runtime_minutes}")
-        else:
-            print("Runtime: Not found")
-
-        # scraping languages
-        languages_element = soup.find('li', {'data-testid': 'title-details-languages'})
-        languages_list = []
-        
-        if languages_element:
-            language_links = languages_element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
-            
-            if language_links:
-                for language_link in language_links:
-                    language = language_link.get_text(strip=True)
-                    languages_list.append(language)
-                
-                languages_str = ', '.join(languages_list)
-                movie_data['spoken_languages'] = languages_str
-                print(f"New Languages: {languages_str}")
-            else:
-                print("Languages not found")
-        else:
-            print("Languages element not found")
-
-        # scraping production companies
-        companies_element = soup.find('li', {'data-testid': 'title-details-companies'})
-        companies_list = []
-        
-        if companies_element:
-            company_links = companies_element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
-            
-            if company_links:
-                for company_link in company_links:
-                    company = company_link.get_text(strip=True)
-                    companies_list.append(company)
-                
-                companies_str = ', '.join(companies_list)
-                movie_data['production_companies'] = companies_str
-                print(f"New Production Companies: {companies_str}")
-            else:
-                print("Production companies links not found")
-        else:
-            print("Production companies element not found")
-
-        # scraping production countries
-        countries_element = soup.find('li', {'data-testid': 'title-details-origin'})
-        countries_list = []
-        
-        if countries_element:
-            country_links = countries_element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
-            
-            if country_links:
-                for country_link in country_links:
-                    country = country_link.get_text(strip=True)
-                    countries_list.append(country)
-                
-                countries_str = ', '.join(countries_list)
-                movie_data['production_countries'] = countries_str
-                print(f"New Production Countries: {countries_str}")
-            else:
-                print("Production countries links not found")
-        else:
-            print("Production countries element not found")
-
-
-
-        # Scraping keywords
-        keywords_ul = soup_keywords.find('ul', class_=lambda x: x and 'ipc-metadata-list' in x)
-
-        keywords = []
-        keywords_str = None
-        if keywords_ul:
-            keyword_items = keywords_ul.find_all('li', class_=lambda x: x and 'ipc-metadata-list-summary-item' in x, limit=15)
-            
-            for keyword_li in keyword_items:
-                keyword_div = keyword_li.find('a', class_=lambda x: x and 'ipc-metadata-list-summary-item__t' in x)
-                if keyword_div:
-                    keyword = keyword_div.get_text(strip=True)
-                    keywords.append(keyword)
-            if keywords:
-                keywords_str = ', '.join(keywords)
-                movie_data['keywords'] = keywords_str
-                print(f"New Plot Keywords: {keywords_str}")
-            else:
-                print("Plot keywords not found")
-        else:
-            print("Plot keyword element not found")
-
-        return movie_data
-        
+        movie_data = parse_pages(responses, use_json=False)
     except Exception as e:
         print(f"Error for movie {imdb_id}: {str(e)}")
         return None
 
-def update_movie_dataset(input_file, saveInterval, start_line=None, end_line=None):
+    for column, value in movie_data.items():
+        print(f"New {column}: {value}")
+    return movie_data
+
+SCRAPED_COLUMNS = ('genres', 'runtime', 'spoken_languages', 'production_companies', 'production_countries', 'keywords')
+
+def update_movie_dataset(input_file, saveInterval, start_line=None, end_line=None, cache=None, journal=None,
+                         resume=False):
+    # start_line / end_line are 1-based and inclusive, like the line numbers in the README
 
     df = pd.read_csv(input_file)
     
@@ -228,20 +118,37 @@ def update_movie_dataset(input_file, saveInterval, start_line=None, end_line=Non
         start_line = start_line - 1
     
     if end_line is None:
-        end_line = len(df)
+        end_line = len(df) - 1
     else:
-        end_line = end_line - 1
+        end_line = min(end_line, len(df)) - 1
+
+    # a resumed run skips finished ids and takes their values from the journal instead
+    skip_ids = set()
+    if journal is not None:
+        if resume:
+            skip_ids = journal.skip_ids()
+            journaled = journal.scraped_data()
+            print(f"Resuming: {len(skip_ids)} movies already finished or out of attempts")
+        else:
+            # only the range being scraped starts over, other ranges keep their progress
+            journal.forget(df['imdb_id'].iloc[start_line:end_line + 1])
+            journaled = {}
     
     print("\n Scraping start")
     print(f"Total movies in dataset: {end_line - start_line + 1}")
     print(f"Processing from movie {start_line + 1} to movie {end_line + 1}")
     print("\n")
     
-    counter = start_line
-    while counter <= end_line:
-        df_subset = df.iloc[counter: (counter + saveInterval)]
-        for index, row in df_subset.iterrows():
+    for batch_start in range(start_line, end_line + 1, saveInterval):
+        batch_end = min(batch_start + saveInterval, end_line + 1)
+        for index, row in df.iloc[batch_start:batch_end].iterrows():
             imdb_id = row['imdb_id']
+
+            if imdb_id in skip_ids:
+                for column, value in journaled.get(imdb_id, {}).items():
+                    if column in SCRAPED_COLUMNS and pd.isnull(row[column]):
+                        df.at[index, column] = value
+                continue
             
             print(f"\nMovie {index + 1}:")
             print(f"Title: {row['title']}")
@@ -253,65 +160,53 @@ def update_movie_dataset(input_file, saveInterval, start_line=None, end_line=Non
             print(f"Production Countries: {row['production_countries']}" if not pd.isnull(row['production_countries']) else "Current Production Countries: None")
             print(f"Keywords: {row['keywords']}" if not pd.isnull(row['keywords']) else "Current Keywords: None")
             
-            if (pd.isnull(row['genres']) or pd.isnull(row['runtime']) or 
-                pd.isnull(row['spoken_languages']) or pd.isnull(row['production_companies']) or
-                pd.isnull(row['production_countries']) or pd.isnull(row['keywords'])):
+            if any(pd.isnull(row[column]) for column in SCRAPED_COLUMNS):
 
                 print()
                 print(f"WEB SCRAPED DATA FOR {imdb_id} ({row['title'].upper()}):")
                 
-                movie_data = scrape_imdb_id(imdb_id)
+                movie_data = scrape_imdb_id(imdb_id, cache)
+                if journal is not None:
+                    journal.record(imdb_id, movie_data)
 
                 # Skip invalid URLs or IMDb ID's
                 if movie_data is None:
                     print(f"Skipping movie {imdb_id} due to scraping failure")
-                    counter += 1
-                    if (counter > end_line):
-                        break
                     continue
                 
                 try: 
-                    if pd.isnull(row['genres']) and 'genres' in movie_data:
-                        df.at[index, 'genres'] = movie_data['genres']
-                    
-                    if pd.isnull(row['runtime']) and 'runtime' in movie_data:
-                        df.at[index, 'runtime'] = movie_data['runtime']
-                    
-                    if pd.isnull(row['spoken_languages']) and 'spoken_languages' in movie_data:
-                        df.at[index, 'spoken_languages'] = movie_data['spoken_languages']
-                    
-                    if pd.isnull(row['production_companies']) and 'production_companies' in movie_data:
-                        df.at[index, 'production_companies'] = movie_data['production_companies']
-                    
-                    if pd.isnull(row['production_countries']) and 'production_countries' in movie_data:
-                        df.at[index, 'production_countries'] = movie_data['production_countries']
-                    
-                    if pd.isnull(row['keywords']) and 'keywords' in movie_data:
-                        df.at[index, 'keywords'] = movie_data['keywords']
+                    for column in SCRAPED_COLUMNS:
+                        if pd.isnull(row[column]) and column in movie_data:
+                            df.at[index, column] = movie_data[column]
                 except Exception as e:
                     print(f"Error: {e}")
             
-            counter += 1
-            if (counter > end_line):
-                break
-            
             print("-" * 50)
 
-        sectionStart = counter - saveInterval
-        name = "scraped_" + str(sectionStart + 1) + "_" + str(counter + 1) + ".csv"
-        df_subset.to_csv(name, index=False)
-        numScrapesLeft = saveInterval
-
-        df_subset = df.iloc[counter:(counter + saveInterval - 1)]
+        # file names use the same 1-based inclusive line numbers as start_line / end_line
+        name = "scraped_" + str(batch_start + 1) + "_" + str(batch_end) + ".csv"
+        df.iloc[batch_start:batch_end].to_csv(name, index=False)
         print("Scraping save")
+
+    if journal is not None:
+        print(f"Journal: {journal.summary()}")
     print("Scraping finished")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape missing movie columns from IMDb")
+    parser.add_argument('--resume', action='store_true', help="skip movies the journal has already finished")
+    args = parser.parse_args()
+
     input_file = 'modern_feature_films.csv'
     
     start = 15000
     end = 15100
     saveInterval = 1000
-    
-    update_movie_dataset(input_file, saveInterval, start, end)
\ No newline at end of file
+
+    journal = ScrapeJournal('scrape_journal.sqlite')
+    page_cache = PageCache('page_cache')
+    update_movie_dataset(input_file, saveInterval, start, end, cache=page_cache, journal=journal,
+                         resume=args.resume)
+    journal.close()
+    page_cache.evict()
\ No newline at end of file
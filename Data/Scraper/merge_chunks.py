@@ -0,0 +1,99 @@
+import glob
+import os
+import tempfile
+import time
+import pandas as pd
+
+# Merges overlapping scraper outputs (scraped_*.csv from imdb_scraper.py and scrap.py, part_*.csv
+# partitions from multiprocess_scraper.py, *_delta.csv checkpoints) into one dataset, one row per
+# imdb_id. Per column the newest non-null value wins: files are ordered by modification time and
+# later rows of a file are newer than earlier ones.
+#
+# Memory stays bounded by streaming the files in chunks and spilling every row to one of n_buckets
+# files by the hash of its imdb_id. Every copy of a movie ends up in the same bucket, so the buckets
+# can be resolved one at a time.
+
+SEQUENCE = '_sequence'
+
+
+def find_chunk_files(patterns):
+    # every file matching any of the glob patterns, oldest first
+    files = {path for pattern in patterns for path in glob.glob(pattern, recursive=True)}
+    return sorted(files, key=os.path.getmtime)
+
+
+def union_columns(files):
+    # all columns of all files in first-seen order, read from the headers only
+    columns = []
+    for path in files:
+        for column in pd.read_csv(path, nrows=0).columns:
+            if column not in columns and column != 'Unnamed: 0':
+                columns.append(column)
+    return columns
+
+
+def spill_to_buckets(files, columns, bucket_dir, n_buckets, chunk_size):
+    bucket_paths = [os.path.join(bucket_dir, f"bucket_{bucket}.csv") for bucket in range(n_buckets)]
+    sequence = 0
+    for path in files:
+        for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str):
+            chunk = chunk.reindex(columns=columns).dropna(subset=['imdb_id'])
+            chunk[SEQUENCE] = range(sequence, sequence + len(chunk))
+            sequence += len(chunk)
+            buckets = pd.util.hash_pandas_object(chunk['imdb_id'], index=False) % n_buckets
+            for bucket, rows in chunk.groupby(buckets.to_numpy()):
+                bucket_path = bucket_paths[bucket]
+                rows.to_csv(bucket_path, mode='a', header=not os.path.exists(bucket_path), index=False)
+    return [path for path in bucket_paths if os.path.exists(path)], sequence
+
+
+def resolve_bucket(bucket_path):
+    # GroupBy.last() takes the last non-null value of every column, i.e. the newest non-null one
+    rows = pd.read_csv(bucket_path, dtype=str).astype({SEQUENCE: 'int64'})
+    rows = rows.sort_values(SEQUENCE, kind='stable')
+    first_seen = rows.groupby('imdb_id', sort=False)[SEQUENCE].min()
+    merged = rows.drop(columns=SEQUENCE).groupby('imdb_id', sort=False).last()
+    return merged.loc[first_seen.sort_values().index].reset_index()
+
+
+def merge_chunks(patterns, output_file, n_buckets=64, chunk_size=50000):
+    """
+    Merge scraped chunk files into one deduplicated dataset.
+
+    :param patterns: Glob patterns of the files to merge
+    :param output_file: Path of the merged CSV file
+    :param n_buckets: Number of spill files, each holding roughly 1/n_buckets of the rows
+    :param chunk_size: Rows read from a file at a time
+    :return: Number of distinct movies written
+    """
+    files = find_chunk_files(patterns)
+    if not files:
+        print(f"No files match {patterns}")
+        return 0
+    columns = union_columns(files)
+    if 'imdb_id' not in columns:
+        raise ValueError("None of the files has an imdb_id column")
+    print(f"Merging {len(files)} files with {len(columns)} columns")
+
+    movies = 0
+    header = True
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as bucket_dir:
+        bucket_paths, total_rows = spill_to_buckets(files, columns, bucket_dir, n_buckets, chunk_size)
+        temp_file = f"{output_file}.tmp"
+        for bucket_path in bucket_paths:
+            merged = resolve_bucket(bucket_path)
+            merged[columns].to_csv(temp_file, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            movies += len(merged)
+        os.replace(temp_file, output_file)
+
+    print(f"Wrote {movies} movies from {total_rows} rows ({total_rows - movies} duplicates) to {output_file}")
+    return movies
+
+
+if __name__ == "__main__":
+    patterns = ['../Datasets/Scraped_Chunks/**/*.csv', 'scraped_*.csv']
+    output_file = '../Datasets/scraped_merged.csv'
+    start = time.time()
+    merge_chunks(patterns, output_file)
+    print(f"Took {time.time() - start:.2f} seconds")
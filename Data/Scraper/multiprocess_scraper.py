@@ -1,28 +1,37 @@
 import multiprocessing
+import os
 import warnings
 import pandas as pd
-from bs4 import BeautifulSoup
-import re
 import requests
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 import time
-import random
+from rate_limiter import SharedRateLimiter, THROTTLE_STATUSES
+from imdb_parsers import PAGE_PATHS, page_url, parse_pages, plan_pages
+from page_cache import PageCache
+from getNeedsScraping import loadWorkQueue
 
 # an attempt at multiprocess scraping using the code from imdb_scraper.py
 
-def parse_runtime_to_minutes(runtime_text):
+# read the main page's embedded JSON first so one page fetch can fill every column
+USE_EMBEDDED_JSON = True
 
-    hours_match = re.search(r'(\d+)hours?', runtime_text)
-    minutes_match = re.search(r'(\d+)minutes?', runtime_text)
+# rate limiter shared by every worker process and optional page cache, set by init_worker()
+limiter = None
+cache = None
 
-    total_minutes = 0
-    if hours_match:
-        total_minutes += int(hours_match.group(1)) * 60
-    if minutes_match:
-        total_minutes += int(minutes_match.group(1))
 
-    return total_minutes if total_minutes > 0 else None
+def init_worker(shared_limiter, page_cache=None):
+    global limiter, cache
+    limiter = shared_limiter
+    cache = page_cache
+
+
+def get_limiter():
+    # scraping outside of a pool still goes through a (process-local) limiter
+    if limiter is None:
+        init_worker(SharedRateLimiter())
+    return limiter
 
 
 def create_retry_session(retries=5, backoff_factor=0.5, status_forcelist=(500, 502, 504, 429, 403), session=None):
@@ -46,221 +55,70 @@ def create_retry_session(retries=5, backoff_factor=0.5, status_forcelist=(500, 5
     return session
 
 
-def scrape_imdb_id(imdb_id, **kwargs):
-    column = kwargs.get('column', 'all')
-
-    print(f"\nScraping for {imdb_id} (Columns: {column})")
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 6.3; Win 64 ; x64) Apple WeKit /537.36(KHTML , like Gecko) Chrome/80.0.3987.162 Safari/537.36'
+}
 
-    session = create_retry_session()
 
-    time.sleep(random.uniform(1, 5))
+def safe_request(session, url, throttle_retries=5):
+    """
+    Safely make a request with error handling and logging
+    """
+    try:
+        for _ in range(throttle_retries + 1):
+            get_limiter().acquire()
+            response = session.get(url, headers=HEADERS, timeout=10)
+            get_limiter().report(response.status_code)
+            if response.status_code not in THROTTLE_STATUSES:
+                break
+
+        if response.status_code != 200:
+            print(f"Warning: Status code {response.status_code} for {url}")
+            return None
 
-    def safe_request(url, session=session):
-        """
-        Safely make a request with error handling and logging
-        """
+        return response
+    except requests.exceptions.RequestException as e:
+        print(f"Request error for {url}: {e}")
+        return None
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 6.3; Win 64 ; x64) Apple WeKit /537.36(KHTML , like Gecko) Chrome/80.0.3987.162 Safari/537.36'
-        }
 
-        try:
-            response = session.get(url, headers=headers, timeout=10)
+def fetch_pages(session, imdb_id, pages):
+    # each page is downloaded once (or read from the page cache) and returned as page type -> HTML
+    responses = {}
+    for page in pages:
+        html = cache.get(imdb_id, page) if cache else None
+        if html is None:
+            response = safe_request(session, page_url(imdb_id, page))
+            if response is None:
+                print(f"Failed to retrieve {page} page for {imdb_id}")
+                continue
+            html = response.text
+            if cache:
+                cache.put(imdb_id, page, html)
+        responses[page] = html
+    return responses
 
-            if response.status_code != 200:
-                print(f"Warning: Status code {response.status_code} for {url}")
-                return None
 
-            return response
-        except requests.exceptions.RequestException as e:
-            print(f"Request error for {url}: {e}")
-            return None
+def scrape_imdb_id(imdb_id, pages=tuple(PAGE_PATHS)):
+    print(f"\nScraping for {imdb_id} (Pages: {', '.join(pages)})")
 
-    urls = {
-        'main': f"https://www.imdb.com/title/{imdb_id}/",
-        'summary': f"https://www.imdb.com/title/{imdb_id}/plotsummary/",
-        'tagline': f"https://www.imdb.com/title/{imdb_id}/taglines/",
-        'keywords': f"https://www.imdb.com/title/{imdb_id}/keywords/"
-    }
+    # throttling is handled by the shared limiter, so urllib3 only retries server errors
+    session = create_retry_session(status_forcelist=(500, 502, 504))
+    responses = fetch_pages(session, imdb_id, pages)
 
-    responses = {}
-    if column == 'all':
-        for key, url in urls.items():
-            response = safe_request(url)
-            if response is None:
-                print(f"Failed to retrieve {key} page for {imdb_id}")
-                return None
-            responses[key] = response
-    else:
-        match column:
-            case 'overview':
-                response = safe_request(urls['summary'])
-            case 'tagline':
-                response = safe_request(urls['tagline'])
-            case 'keywords':
-                response = safe_request(urls['keywords'])
-            case _:
-                response = safe_request(urls['main'])
-        if not response:
-            print(f"Failed to retrieve {column} page for {imdb_id}")
-            return None
-        responses[column] = response
+    if not responses:
+        return None
 
     movie_data = {}
     print(f"\nParsing scraped data for {imdb_id}")
-    try:
-        if column == 'all' or column != 'overview' or column != 'tagline' or column != 'keywords':
-            soup = BeautifulSoup(responses['main'].text, 'html.parser')
-            # Scraping genres
-            chip_list_scrollers = soup.find_all('div', class_='ipc-chip-list__scroller')
-            if chip_list_scrollers:
-                genres_scroller = chip_list_scrollers[0]
-                genres = [
-                    genre.find('span', class_='ipc-chip__text').get_text(strip=True)
-                    for genre in genres_scroller.find_all('a', class_='ipc-chip')
-                ]
-                if genres:
-                    movie_data['genres'] = ', '.join(genres)
-                    print(f"    New Genres: {', '.join(genres)}")
-                else:
-                    print("    Genres not found")
-            # Scraping for movie runtime
-            runtime_element = soup.find('li', attrs={'data-testid': 'title-techspec_runtime'})
-            if runtime_element:
-                runtime_text = runtime_element.find('div', class_='ipc-metadata-list-item__content-container').get_text(
-                    strip=True)
-                if runtime_text:
-                    runtime_minutes = parse_runtime_to_minutes(runtime_text)
-                    if runtime_minutes:
-                        movie_data['runtime'] = runtime_minutes
-                        print(f"    New Runtime: {runtime_minutes}")
-            else:
-                print("    Runtime: Not found")
-            # Scraping languages
-            languages_element = soup.find('li', {'data-testid': 'title-details-languages'})
-            languages_list = []
-            if languages_element:
-                language_links = languages_element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
-                if language_links:
-                    for language_link in language_links:
-                        language = language_link.get_text(strip=True)
-                        languages_list.append(language)
-                    languages_str = ', '.join(languages_list)
-                    movie_data['spoken_languages'] = languages_str
-                    print(f"    New Languages: {languages_str}")
-                else:
-                    print("    Languages not found")
-            else:
-                print("    Languages element not found")
-            # Scraping production companies
-            companies_element = soup.find('li', {'data-testid': 'title-details-companies'})
-            companies_list = []
-            if companies_element:
-                company_links = companies_element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
-
-                if company_links:
-                    for company_link in company_links:
-                        company = company_link.get_text(strip=True)
-                        companies_list.append(company)
-
-                    companies_str = ', '.join(companies_list)
-                    movie_data['production_companies'] = companies_str
-                    print(f"    New Production Companies: {companies_str}")
-                else:
-                    print("    Production companies links not found")
-            else:
-                print("    Production companies element not found")
-            # Scraping production countries
-            countries_element = soup.find('li', {'data-testid': 'title-details-origin'})
-            countries_list = []
-            if countries_element:
-                country_links = countries_element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
-
-                if country_links:
-                    for country_link in country_links:
-                        country = country_link.get_text(strip=True)
-                        countries_list.append(country)
-
-                    countries_str = ', '.join(countries_list)
-                    movie_data['production_countries'] = countries_str
-                    print(f"    New Production Countries: {countries_str}")
-                else:
-                    print("    Production countries links not found")
-            else:
-                print("    Production countries element not found")
-    except Exception as e:
-        print(f"    Couldn't parse {imdb_id} (Column: {column}): {urls['main']} : {e}")
-        return None
-
-    try:
-        if column == 'overview':
-            soup_summary = BeautifulSoup(responses['summary'].text, 'html.parser')
-            # Scraping plot summary
-            plot_li = soup_summary.find('li', id=lambda x: x and x.startswith('po'))
-
-            if plot_li:
-                plot_div = plot_li.find('div', class_='ipc-html-content-inner-div', recursive=True)
-
-                if plot_div:
-                    overview_text = plot_div.get_text(strip=True)
-                    movie_data['overview'] = overview_text
-                    print(f"    New Plot Overview: {overview_text}")
-                else:
-                    print("    Plot overview not found")
-            else:
-                print("    Plot overview element not found")
-    except Exception as e:
-        print(f"    Couldn't parse {imdb_id} (Column: {column}): {urls['summary']} : {e}")
-        return None
+    for page, html in responses.items():
+        try:
+            movie_data.update(parse_pages({page: html}, use_json=USE_EMBEDDED_JSON))
+        except Exception as e:
+            print(f"    Couldn't parse {imdb_id} (Page: {page}): {page_url(imdb_id, page)} : {e}")
 
-    try:
-        if column == 'tagline':
-            soup_tagline = BeautifulSoup(responses['tagline'].text, 'html.parser')
-            # Scraping plot tagline
-            tagline_ul = soup_tagline.find('ul',
-                                           class_='ipc-metadata-list ipc-metadata-list--dividers-between sc-bda8bbe6-0 jxZlgE meta-data-list-full ipc-metadata-list--base')
-            if tagline_ul:
-                first_tagline_li = tagline_ul.find('li', class_='ipc-metadata-list__item')
-                if first_tagline_li:
-                    tagline_div = first_tagline_li.find('div', class_='ipc-html-content-inner-div')
-                    first_tagline_text = tagline_div.get_text(strip=True) if tagline_div else None
-                    movie_data['tagline'] = first_tagline_text
-                    print(f"    New Plot Tagline: {first_tagline_text}")
-                else:
-                    print("    Plot tagline not found")
-            else:
-                print("    Plot tagline element not found")
-    except Exception as e:
-        print(f"    Couldn't parse {imdb_id} (Column: {column}): {urls['tagline']} : {e}")
-        return None
-
-    try:
-        if column == 'keywords':
-            soup_keywords = BeautifulSoup(responses['keywords'].text, 'html.parser')
-            # Scraping keywords
-            keywords_ul = soup_keywords.find('ul', class_=lambda x: x and 'ipc-metadata-list' in x)
-            keywords = []
-            keywords_str = None
-            if keywords_ul:
-                keyword_items = keywords_ul.find_all('li', class_=lambda x: x and 'ipc-metadata-list-summary-item' in x,
-                                                     limit=15)
-
-                for keyword_li in keyword_items:
-                    keyword_div = keyword_li.find('a', class_=lambda x: x and 'ipc-metadata-list-summary-item__t' in x)
-                    if keyword_div:
-                        keyword = keyword_div.get_text(strip=True)
-                        keywords.append(keyword)
-                if keywords:
-                    keywords_str = ', '.join(keywords)
-                    movie_data['keywords'] = keywords_str
-                    print(f"    New Plot Keywords: {keywords_str}")
-                else:
-                    print("    Plot keywords not found")
-            else:
-                print("    Plot keyword element not found")
-    except Exception as e:
-        print(f"    Couldn't parse {imdb_id} (Column: {column}): {urls['keywords']} : {e}")
-        return None
+    for column, value in movie_data.items():
+        print(f"    New {column}: {value}")
 
     print()
     return movie_data
@@ -283,80 +141,169 @@ def print_movie_data(index, movie, **kwargs):
             movie.production_countries) else "Current Production Countries: None")
         print(f"Keywords: {movie.keywords}" if not pd.isnull(movie.keywords) else "Current Keywords: None")
 
+def legacy_page_count(movie, filled):
+    # pages the old per-column strategy would have requested: one page per missing
+    # overview/tagline/keywords, then all four pages again if anything was still null
+    targeted = [column for column in ('overview', 'tagline', 'keywords') if pd.isnull(movie[column])]
+    still_null = any(pd.isnull(value) and not (column in targeted and column in filled)
+                     for column, value in movie.items())
+    return len(targeted) + (len(PAGE_PATHS) if still_null else 0)
+
+
 def process_movie(index, movie):
     imdb_id = movie.imdb_id
 
     print_movie_data(index, movie)
 
-    if pd.isnull(movie.overview):
-        movie_data = scrape_imdb_id(imdb_id, column='overview')
-        if movie_data:
-            movie['overview'] = movie_data['overview']
-    if pd.isnull(movie.tagline):
-        movie_data = scrape_imdb_id(imdb_id, column='tagline')
-        if movie_data:
-            movie['tagline'] = movie_data['tagline']
-    if pd.isnull(movie.keywords):
-        movie_data = scrape_imdb_id(imdb_id, column='keywords')
-        if movie_data:
-            movie['keywords'] = movie_data['keywords']
-
-    if movie.isnull().any():
-        movie_data = scrape_imdb_id(imdb_id)
-        if movie_data:
-            for column, value in movie.items():
-                if pd.isnull(value) and column in movie_data:
-                    print(f"Swapped {movie_data[column]} into {movie[column]}")
-                    movie[column] = movie_data[column]
-        else:
-            print(f"Skipping movie {imdb_id} due to scraping failure")
-
-    return index, movie
+    stats = {'movies': 1, 'pages_fetched': 0, 'pages_saved': 0}
+    pages = plan_pages(movie, use_json=USE_EMBEDDED_JSON)
+    if not pages:
+        return index, movie, stats
+
+    movie_data = scrape_imdb_id(imdb_id, pages) or {}
+    # only fetch the other pages for columns the first round could not fill
+    followup = [page for page in plan_pages(movie, found=movie_data) if page not in pages]
+    if followup:
+        movie_data.update(scrape_imdb_id(imdb_id, followup) or {})
+    stats['pages_fetched'] = len(pages) + len(followup)
+    stats['pages_saved'] = legacy_page_count(movie, movie_data) - stats['pages_fetched']
+
+    if movie_data:
+        for column, value in movie.items():
+            if pd.isnull(value) and column in movie_data:
+                print(f"Swapped {movie_data[column]} into {movie[column]}")
+                movie[column] = movie_data[column]
+    else:
+        print(f"Skipping movie {imdb_id} due to scraping failure")
+
+    return index, movie, stats
 
 def process_chunk(chunk):
+    started = time.time()
+    stats = {'movies': 0, 'pages_fetched': 0, 'pages_saved': 0}
+    rows = []
     for index, movie in chunk.iterrows():
-        result_index, result_movie = process_movie(index, movie)
-        result_movie = result_movie.drop(['Unnamed: 0'])
-        movie = result_movie
-
-    return chunk
-
-def update_movie_dataset(input_file, **kwargs):
-
+        result_index, result_movie, movie_stats = process_movie(index, movie)
+        rows.append(result_movie.drop(['Unnamed: 0'], errors='ignore'))
+        for key, value in movie_stats.items():
+            stats[key] += value
+
+    stats['seconds'] = time.time() - started
+    return pd.DataFrame(rows), stats
+
+def make_batches(df_subset, target_pages=40, max_rows=200, page_counts=None):
+    """
+    Split rows into small contiguous batches of roughly equal work for dynamic scheduling. The batches
+    keep the order of df_subset, so a prioritised work queue is still scraped in priority order.
+
+    :param df_subset: Rows to scrape
+    :param target_pages: Estimated page fetches per batch
+    :param max_rows: Upper bound on rows per batch, so rows needing no pages still get split up
+    :param page_counts: Optional page fetches per row, e.g. from the work queue, instead of planning every row
+    :return: List of (estimated pages, batch) in row order
+    """
+    if page_counts is None:
+        page_counts = [len(plan_pages(movie, use_json=USE_EMBEDDED_JSON)) for index, movie in df_subset.iterrows()]
+    batches = []
+    batch_start = 0
+    batch_pages = 0
+    for position, row_pages in enumerate(page_counts):
+        batch_pages += row_pages
+        if batch_pages >= target_pages or position + 1 - batch_start >= max_rows:
+            batches.append((batch_pages, df_subset.iloc[batch_start:position + 1]))
+            batch_start = position + 1
+            batch_pages = 0
+    if batch_start < len(df_subset):
+        batches.append((batch_pages, df_subset.iloc[batch_start:]))
+    return batches
+
+def write_partition(rows, output_dir):
+    # one file per finished chunk, renamed into place so a crash never leaves a partial partition
+    path = os.path.join(output_dir, f"part_{rows.index[0]}_{rows.index[-1]}.csv")
+    temp_path = f"{path}.tmp"
+    rows.to_csv(temp_path, index=False)
+    os.replace(temp_path, path)
+    return path
+
+def update_movie_dataset(input_file, output_dir, **kwargs):
+    """
+    Scrape a range of rows with a process pool, streaming every finished chunk to its own partition file.
+
+    :param input_file: Path to the input CSV file
+    :param output_dir: Directory the part_<first>_<last>.csv partitions are written to
+    :param kwargs: start_line, end_line (inclusive), processes, target_pages, max_rows, limiter, cache and
+                   queue_file (scrapeQueue.csv from getNeedsScraping.py, to only visit the rows it lists)
+    :return: List of written partition paths
+    """
     df = pd.read_csv(input_file)
 
     start_line = kwargs.get('start_line', 0)
-    end_line = kwargs.get('end_line', len(df))
+    end_line = kwargs.get('end_line', len(df) - 1)
     processes = kwargs.get('processes', 4)
 
-    end_line += 1
-    df_subset = df.iloc[start_line : end_line]
+    page_counts = None
+    if kwargs.get('queue_file'):
+        # the queue already knows which rows miss something, in priority order, so skip everything else
+        queue = loadWorkQueue(kwargs['queue_file'], start_line, end_line)
+        df_subset = df.iloc[queue['row']]
+        # a JSON main page covers every column, the follow-up pages are only fetched if it falls short
+        page_counts = [1] * len(queue) if USE_EMBEDDED_JSON else queue['pageCount'].tolist()
+    else:
+        df_subset = df.iloc[start_line : end_line + 1]
+    del df
 
     if processes == multiprocessing.cpu_count():
         warnings.warn(f"Number of processes ({processes}) exceeds number of CPU cores ({multiprocessing.cpu_count()})!")
 
-    pool = multiprocessing.Pool(processes)
-    chunk_size = int(df_subset.shape[0] / processes)
-    chunks = [df_subset.iloc[i:i + chunk_size] for i in range(0, df_subset.shape[0], chunk_size)]
+    os.makedirs(output_dir, exist_ok=True)
+    shared_limiter = kwargs.get('limiter') or SharedRateLimiter()
+    page_cache = kwargs.get('cache')
+    pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=(shared_limiter, page_cache))
+    batches = make_batches(df_subset, kwargs.get('target_pages', 40), kwargs.get('max_rows', 200), page_counts)
+    chunks = [batch for estimated_pages, batch in batches]
 
     print("Starting Scrape")
     print(f"Total movies in dataset range: {len(df_subset)}")
-    print(f"Processing from movie {start_line} to movie {end_line} in {len(chunks)} chunks of {chunk_size}")
+    print(f"Processing from movie {start_line} to movie {end_line} in {len(chunks)} batches "
+          f"(~{sum(estimated_pages for estimated_pages, batch in batches)} page fetches)")
     print("-" * 50)
 
-    outputs_async = pool.map_async(process_chunk, chunks)
-    outputs = outputs_async.get()
+    # chunksize=1: an idle worker takes the next batch, and each finished batch goes straight to disk
+    run_start = time.time()
+    partitions = []
+    page_stats = {'movies': 0, 'pages_fetched': 0, 'pages_saved': 0, 'seconds': 0.0}
+    for rows, chunk_stats in pool.imap_unordered(process_chunk, chunks, chunksize=1):
+        if not rows.empty:
+            partitions.append(write_partition(rows, output_dir))
+            print(f"Saved {len(rows)} movies to {partitions[-1]}")
+        for key, value in chunk_stats.items():
+            page_stats[key] += value
     pool.close()
+    pool.join()
+
+    makespan = time.time() - run_start
+    ideal = page_stats['seconds'] / processes
+    print(f"Makespan {makespan:.1f} seconds, ideal {ideal:.1f} seconds "
+          f"({100 * ideal / makespan if makespan else 100:.0f}% worker utilisation)")
+
+    print(f"Fetched {page_stats['pages_fetched']} pages for {page_stats['movies']} movies, "
+          f"saving {page_stats['pages_saved']} requests over per-column scraping")
+
+    stats = shared_limiter.stats()
+    print(f"Made {stats['requests']} requests at {stats['requests_per_second']:.2f} requests/sec "
+          f"({stats['throttled']} throttled, final rate limit {stats['rate_limit']:.2f}/sec)")
 
-    return outputs
+    return partitions
 
 if __name__ == "__main__":
 
     input_file = '../Datasets/clean.csv'
     start_line = 100
     end_line = 200 #inclusive
+    output_dir = f'../Datasets/Scraped_Chunks/scraped_{start_line}_{end_line}'
     start = time.time()
-    results = update_movie_dataset(input_file, start_line=start_line, end_line=end_line, processes=15)
-    output = pd.concat(results).drop('Unnamed: 0', axis=1)
-    output.to_csv(f'../Datasets/scraped_{start_line}_{end_line}.csv')
+    page_cache = PageCache('../Datasets/page_cache')
+    update_movie_dataset(input_file, output_dir, start_line=start_line, end_line=end_line, processes=15,
+                         cache=page_cache)
+    page_cache.evict()
     print(f"Took {time.time() - start} seconds to process {end_line - start_line + 1} movies")
\ No newline at end of file
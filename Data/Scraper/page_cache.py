@@ -0,0 +1,143 @@
+import argparse
+import gzip
+import hashlib
+import os
+import time
+import pandas as pd
+from imdb_parsers import PAGE_PATHS, parse_pages
+
+# Compressed on-disk cache of scraped IMDb pages. Every page is stored gzipped under the hash of
+# its (imdb_id, page type) key, so re-running a scraper or fixing a parser does not need the network.
+# The scrapers call evict() at the end of every run; by default the cache is unbounded, since a full
+# catalog is needed for offline re-parsing. With max_bytes set, the least recently read pages go first.
+
+
+class PageCache:
+    def __init__(self, cache_dir, ttl=None, max_bytes=None):
+        """
+        :param cache_dir: Directory holding the cached pages, created if missing
+        :param ttl: Seconds a page stays valid, None to keep pages forever
+        :param max_bytes: Size budget enforced by evict(), None for no limit
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, imdb_id, page):
+        digest = hashlib.sha1(f"{imdb_id}/{page}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.html.gz")
+
+    def expired(self, path):
+        return self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl
+
+    def get(self, imdb_id, page):
+        # cached HTML of a page, or None if it is missing or expired
+        path = self.path(imdb_id, page)
+        try:
+            if self.expired(path):
+                os.remove(path)
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                html = file.read()
+            # mark the read in the access time for evict(); the mtime keeps the write time for the ttl
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+            return html
+        except (OSError, EOFError):
+            return None
+
+    def put(self, imdb_id, page, html):
+        path = self.path(imdb_id, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so readers never see a half-written page
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as file:
+            file.write(html)
+        os.replace(temp_path, path)
+
+    def get_pages(self, imdb_id, pages=PAGE_PATHS):
+        # dict of page type -> HTML for every cached page of a movie
+        cached = {}
+        for page in pages:
+            html = self.get(imdb_id, page)
+            if html is not None:
+                cached[page] = html
+        return cached
+
+    def evict(self):
+        """
+        Remove expired pages, then the least recently read pages until the cache fits in max_bytes.
+
+        :return: Number of pages removed
+        """
+        if self.ttl is None and self.max_bytes is None:
+            return 0
+        entries = []
+        removed = 0
+        for directory, _, files in os.walk(self.cache_dir):
+            for name in files:
+                # pages still being written by put()
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                if self.expired(path):
+                    os.remove(path)
+                    removed += 1
+                else:
+                    stat = os.stat(path)
+                    entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if self.max_bytes is not None and total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                os.remove(path)
+                removed += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+        print(f"Evicted {removed} cached pages, {total / 1e6:.1f} MB remaining")
+        return removed
+
+
+def reparse_from_cache(input_file, cache, overwrite=False):
+    """
+    Offline mode: re-extract every column from cached pages without touching the network.
+
+    :param input_file: Path to the dataset CSV file
+    :param cache: PageCache holding previously scraped pages
+    :param overwrite: Replace existing values instead of only filling nulls
+    :return: Updated DataFrame
+    """
+    df = pd.read_csv(input_file)
+    updated = 0
+    for index, imdb_id in df['imdb_id'].items():
+        pages = cache.get_pages(imdb_id)
+        if not pages:
+            continue
+        try:
+            movie_data = parse_pages(pages)
+        except Exception as e:
+            print(f"Couldn't parse cached pages of {imdb_id}: {e}")
+            continue
+        for column, value in movie_data.items():
+            if column in df.columns and (overwrite or pd.isnull(df.at[index, column])):
+                df.at[index, column] = value
+        updated += 1
+
+    print(f"Re-parsed {updated} cached movies out of {len(df)}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-parse the dataset from cached IMDb pages")
+    parser.add_argument('--overwrite', action='store_true', help="replace existing values, not only nulls")
+    args = parser.parse_args()
+
+    input_file = '../Datasets/clean.csv'
+    cache_dir = '../Datasets/page_cache'
+    start = time.time()
+    page_cache = PageCache(cache_dir)
+    output = reparse_from_cache(input_file, page_cache, overwrite=args.overwrite)
+    output.to_csv('../Datasets/reparsed.csv', index=False)
+    print(f"Took {time.time() - start:.2f} seconds")
@@ -0,0 +1,145 @@
+import os
+import re
+import time
+from bs4 import BeautifulSoup
+from imdb_parsers import BACKENDS, PAGE_PARSERS, parse_runtime_to_minutes
+
+# Micro-benchmark of the extraction backends on saved IMDb pages, against the find/find_all code the
+# scrapers used before imdb_parsers.py as the baseline. Every backend's output is checked against it.
+# Fixture pages are named <imdb_id>_<page>.html, e.g. tt1375666_main.html or tt1375666_keywords.html;
+# Data/Datasets/fixtures holds a small committed set modelled on IMDb's markup.
+
+FIXTURE_PATTERN = re.compile(r'^(tt\d+)_(main|summary|tagline|keywords)\.html$')
+BASELINE = 'legacy'
+
+
+def legacy_links(soup, testid):
+    element = soup.find('li', {'data-testid': testid})
+    if element:
+        links = element.find_all('a', class_='ipc-metadata-list-item__list-content-item')
+        return ', '.join(link.get_text(strip=True) for link in links) if links else None
+    return None
+
+
+def legacy_main_page(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    movie_data = {}
+    chip_list_scrollers = soup.find_all('div', class_='ipc-chip-list__scroller')
+    if chip_list_scrollers:
+        genres = [genre.find('span', class_='ipc-chip__text').get_text(strip=True)
+                  for genre in chip_list_scrollers[0].find_all('a', class_='ipc-chip')]
+        if genres:
+            movie_data['genres'] = ', '.join(genres)
+
+    runtime_element = soup.find('li', attrs={'data-testid': 'title-techspec_runtime'})
+    if runtime_element:
+        runtime_text = runtime_element.find('div', class_='ipc-metadata-list-item__content-container').get_text(strip=True)
+        runtime_minutes = parse_runtime_to_minutes(runtime_text) if runtime_text else None
+        if runtime_minutes:
+            movie_data['runtime'] = runtime_minutes
+
+    for column, testid in (('spoken_languages', 'title-details-languages'),
+                           ('production_companies', 'title-details-companies'),
+                           ('production_countries', 'title-details-origin')):
+        items = legacy_links(soup, testid)
+        if items:
+            movie_data[column] = items
+    return movie_data
+
+
+def legacy_summary_page(html):
+    plot_li = BeautifulSoup(html, 'html.parser').find('li', id=lambda x: x and x.startswith('po'))
+    plot_div = plot_li.find('div', class_='ipc-html-content-inner-div', recursive=True) if plot_li else None
+    return {'overview': plot_div.get_text(strip=True)} if plot_div else {}
+
+
+def legacy_tagline_page(html):
+    tagline_ul = BeautifulSoup(html, 'html.parser').find(
+        'ul', class_='ipc-metadata-list ipc-metadata-list--dividers-between sc-bda8bbe6-0 jxZlgE meta-data-list-full ipc-metadata-list--base')
+    first_tagline_li = tagline_ul.find('li', class_='ipc-metadata-list__item') if tagline_ul else None
+    tagline_div = first_tagline_li.find('div', class_='ipc-html-content-inner-div') if first_tagline_li else None
+    return {'tagline': tagline_div.get_text(strip=True)} if tagline_div else {}
+
+
+def legacy_keywords_page(html, limit=15):
+    keywords_ul = BeautifulSoup(html, 'html.parser').find('ul', class_=lambda x: x and 'ipc-metadata-list' in x)
+    if not keywords_ul:
+        return {}
+    keywords = []
+    for keyword_li in keywords_ul.find_all('li', class_=lambda x: x and 'ipc-metadata-list-summary-item' in x, limit=limit):
+        keyword_a = keyword_li.find('a', class_=lambda x: x and 'ipc-metadata-list-summary-item__t' in x)
+        if keyword_a:
+            keywords.append(keyword_a.get_text(strip=True))
+    return {'keywords': ', '.join(keywords)} if keywords else {}
+
+
+LEGACY_PARSERS = {
+    'main': legacy_main_page,
+    'summary': legacy_summary_page,
+    'tagline': legacy_tagline_page,
+    'keywords': legacy_keywords_page,
+}
+
+
+def load_fixtures(fixture_dir):
+    fixtures = []
+    for name in sorted(os.listdir(fixture_dir)):
+        match = FIXTURE_PATTERN.match(name)
+        if match:
+            with open(os.path.join(fixture_dir, name), encoding='utf-8') as file:
+                fixtures.append((match.group(1), match.group(2), file.read()))
+    return fixtures
+
+
+def time_parser(parse, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        movie_data = parse(html)
+    return movie_data, (time.perf_counter() - start) * 1000 / repeat
+
+
+def benchmark_backends(fixtures, repeat=5):
+    """
+    Time the legacy parsers and every backend on every fixture page, checking each backend's output
+    against the legacy parsers.
+
+    :param fixtures: List of (imdb_id, page, html) from load_fixtures()
+    :param repeat: Number of timed passes over the fixtures
+    :return: Dict of 'legacy' or backend -> {'ms_per_page': {page: mean ms}, 'mismatches': [(imdb_id, page)]}
+    """
+    parsers = {BASELINE: LEGACY_PARSERS}
+    for backend in BACKENDS:
+        parsers[backend] = {page: (lambda html, parse=parse, backend=backend: parse(html, backend))
+                            for page, parse in PAGE_PARSERS.items()}
+
+    expected = {}
+    results = {}
+    for name, page_parsers in parsers.items():
+        timings = {}
+        mismatches = []
+        for imdb_id, page, html in fixtures:
+            movie_data, ms = time_parser(page_parsers[page], html, repeat)
+            timings.setdefault(page, []).append(ms)
+            if name == BASELINE:
+                expected[(imdb_id, page)] = movie_data
+            elif movie_data != expected[(imdb_id, page)]:
+                mismatches.append((imdb_id, page))
+        results[name] = {
+            'ms_per_page': {page: sum(times) / len(times) for page, times in timings.items()},
+            'mismatches': mismatches,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    fixture_dir = '../Datasets/fixtures'
+    fixtures = load_fixtures(fixture_dir)
+    print(f"Benchmarking the legacy parsers and {len(BACKENDS)} backends on {len(fixtures)} fixture pages")
+
+    results = benchmark_backends(fixtures)
+    baseline = results[BASELINE]['ms_per_page']
+    for name, result in results.items():
+        timings = ', '.join(f"{page} {ms:.2f} ms ({baseline[page] / ms:.1f}x)" for page, ms in result['ms_per_page'].items())
+        print(f"{name}: {timings}")
+        for imdb_id, page in result['mismatches']:
+            print(f"    output differs from the legacy parser for {imdb_id} {page} page")
@@ -0,0 +1,81 @@
+import multiprocessing
+import time
+
+THROTTLE_STATUSES = (429, 403)
+
+
+class SharedRateLimiter:
+    """
+    Token bucket shared by every scraper process, with AIMD rate adaptation.
+
+    The rate grows additively while responses come back 200 and is cut multiplicatively for
+    everyone as soon as any worker sees a 429/403. Create it in the parent and hand it to the
+    pool through the initializer (see multiprocess_scraper.init_worker).
+    """
+
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=20.0, increase=0.05, decrease=0.5, burst=1.0):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+
+        self.lock = multiprocessing.Lock()
+        self.rate = multiprocessing.Value('d', rate, lock=False)
+        self.tokens = multiprocessing.Value('d', burst, lock=False)
+        self.updated = multiprocessing.Value('d', time.monotonic(), lock=False)
+        # no rate decrease before this time, so one burst of 429s only halves the rate once
+        self.cooldown_until = multiprocessing.Value('d', 0.0, lock=False)
+        self.started = multiprocessing.Value('d', time.monotonic(), lock=False)
+        self.requests = multiprocessing.Value('l', 0, lock=False)
+        self.successes = multiprocessing.Value('l', 0, lock=False)
+        self.throttled = multiprocessing.Value('l', 0, lock=False)
+
+    def reserve(self):
+        # take a token if one is available, otherwise return the seconds until one will be
+        with self.lock:
+            now = time.monotonic()
+            rate = self.rate.value
+            self.tokens.value = min(self.burst, self.tokens.value + (now - self.updated.value) * rate)
+            self.updated.value = now
+            if self.tokens.value >= 1:
+                self.tokens.value -= 1
+                self.requests.value += 1
+                return 0.0
+            return (1 - self.tokens.value) / rate
+
+    def acquire(self):
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    def report(self, status_code):
+        """
+        Feed a response status back into the limiter.
+
+        :param status_code: HTTP status of the response
+        """
+        with self.lock:
+            now = time.monotonic()
+            if status_code == 200:
+                self.successes.value += 1
+                self.rate.value = min(self.max_rate, self.rate.value + self.increase)
+            elif status_code in THROTTLE_STATUSES:
+                self.throttled.value += 1
+                if now >= self.cooldown_until.value:
+                    self.rate.value = max(self.min_rate, self.rate.value * self.decrease)
+                    # drain the bucket so every worker pauses, not just the throttled one
+                    self.tokens.value = min(self.tokens.value, 0.0)
+                    self.cooldown_until.value = now + 1 / self.rate.value
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started.value
+            return {
+                'rate_limit': self.rate.value,
+                'requests': self.requests.value,
+                'successes': self.successes.value,
+                'throttled': self.throttled.value,
+                'requests_per_second': self.requests.value / elapsed if elapsed > 0 else 0.0,
+            }
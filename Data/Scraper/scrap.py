@@ -1,26 +1,16 @@
 import pandas as pd
 import warnings
-from bs4 import BeautifulSoup
 import requests
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 import time
 import random
-import re
 import os
-
-def parse_runtime_to_minutes(runtime_text):
-    hours_match = re.search(r'(\d+)hours?', runtime_text)
-    minutes_match = re.search(r'(\d+)minutes?', runtime_text)
-
-    total_minutes = 0
-    if hours_match:
-        total_minutes += int(hours_match.group(1)) * 60
-    if minutes_match:
-        total_minutes += int(minutes_match.group(1))
-
-    return total_minutes if total_minutes > 0 else None
-
+import argparse
+from delta_checkpoint import append_delta
+from imdb_parsers import parse_pages
+from page_cache import PageCache
+from scrape_journal import ScrapeJournal
 
 def create_retry_session(retries=5, backoff_factor=0.5, status_forcelist=(500, 502, 504, 429, 403), session=None):
     session = session or requests.Session()
@@ -38,38 +28,43 @@ def create_retry_session(retries=5, backoff_factor=0.5, status_forcelist=(500, 5
     return session
 
 
-def scrape_keywords(imdb_id):
-    """Scrape keywords for a given IMDb ID."""
+def scrape_keywords(imdb_id, cache=None):
+    """Scrape keywords for a given IMDb ID, reading the page from the cache when it is there."""
     url = f"https://www.imdb.com/title/{imdb_id}/keywords/"
-    session = create_retry_session()
-    time.sleep(random.uniform(1, 5))  # Random delay to avoid rate limiting
 
     try:
-        response = session.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-        if response.status_code != 200:
-            print(f"Failed to retrieve keywords for {imdb_id}: Status {response.status_code}")
-            return None
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        keywords_ul = soup.find('ul', class_=lambda x: x and 'ipc-metadata-list' in x)
-        if keywords_ul:
-            keyword_items = keywords_ul.find_all('li', class_=lambda x: x and 'ipc-metadata-list-summary-item' in x, limit=15)
-            keywords = [item.get_text(strip=True) for item in keyword_items]
-            return ', '.join(keywords) if keywords else None
+        html = cache.get(imdb_id, 'keywords') if cache else None
+        if html is None:
+            session = create_retry_session()
+            time.sleep(random.uniform(1, 5))  # Random delay to avoid rate limiting
+            response = session.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+            if response.status_code != 200:
+                print(f"Failed to retrieve keywords for {imdb_id}: Status {response.status_code}")
+                return None
+            html = response.text
+            if cache:
+                cache.put(imdb_id, 'keywords', html)
+
+        # the shared keywords parser, on the backend configured in imdb_parsers.py
+        return parse_pages({'keywords': html}).get('keywords')
     except Exception as e:
         print(f"Error scraping keywords for {imdb_id}: {e}")
         return None
 
 
-def update_keywords_column(input_file, output_dir, start_line=0, end_line=None, batch_size=1000):
+def update_keywords_column(input_file, output_dir, start_line=0, end_line=None, batch_size=1000, cache=None,
+                           journal=None, resume=False):
     """
     Update the keywords column in the DataFrame with data scraped from IMDb.
 
     :param input_file: Path to the input CSV file
-    :param output_dir: Directory to save the output files
+    :param output_dir: Directory holding keywords_delta.csv, the changed rows appended at every checkpoint
     :param start_line: Start index for processing
     :param end_line: End index for processing (inclusive)
     :param batch_size: Number of updates after which to save a file
+    :param cache: Optional PageCache to read pages from and store fetched pages in
+    :param journal: Optional ScrapeJournal every attempt is recorded in
+    :param resume: Skip the movies the journal has already finished instead of starting over
     """
     # Load the DataFrame
     df = pd.read_csv(input_file)
@@ -78,39 +73,60 @@ def update_keywords_column(input_file, output_dir, start_line=0, end_line=None,
 
     print(f"Processing {len(df_subset)} rows from line {start_line} to {end_line}")
 
+    skip_ids = set()
+    if journal is not None:
+        if resume:
+            # journaled keywords are already in keywords_delta.csv, finished movies only need skipping
+            skip_ids = journal.skip_ids()
+            print(f"Resuming: {len(skip_ids)} movies already finished or out of attempts")
+        else:
+            journal.forget(df_subset['imdb_id'])
+
+    delta_file = os.path.join(output_dir, 'keywords_delta.csv')
+    updates = []
     update_count = 0
-    batch_start = start_line
+
+    def save_updates(updates):
+        append_delta(delta_file, updates)
+        # journal the movies only once their keywords are on disk, so a crash followed by --resume
+        # re-scrapes unsaved movies instead of skipping them
+        if journal is not None:
+            for update in updates:
+                journal.record(update['imdb_id'], {'keywords': update['keywords']})
 
     for index, row in df_subset.iterrows():
-        if pd.isnull(row['keywords']):  # Only update if keywords are missing
+        if pd.isnull(row['keywords']) and row['imdb_id'] not in skip_ids:  # Only update if keywords are missing
             imdb_id = row['imdb_id']
             print(f"Scraping keywords for index {index}, IMDb ID: {imdb_id}")
-            keywords = scrape_keywords(imdb_id)
+            keywords = scrape_keywords(imdb_id, cache)
+            if journal is not None and not keywords:
+                journal.record(imdb_id, None)
             if keywords:
-                df.at[index, 'keywords'] = keywords
+                updates.append({'imdb_id': imdb_id, 'keywords': keywords})
                 update_count += 1
                 print(f"Updated keywords for index {index}: {keywords}")
             else:
                 print(f"No keywords found for index {index}")
 
-        # Save progress every `batch_size` updates
-        if update_count > 0 and update_count % batch_size == 0:
-            batch_end = index
-            output_file = os.path.join(output_dir, f'scraped_{batch_start}_{batch_end}.csv')
-            df.to_csv(output_file, index=False)
-            print(f"Saved progress to {output_file}")
-            batch_start = index + 1  # Update batch start
+        # Save progress every `batch_size` updates, appending only the changed rows
+        if len(updates) >= batch_size:
+            save_updates(updates)
+            print(f"Saved {len(updates)} updates to {delta_file}")
+            updates = []
 
     # Save any remaining updates after the loop
-    if update_count % batch_size != 0:
-        batch_end = end_line
-        output_file = os.path.join(output_dir, f'scraped_{batch_start}_{batch_end}.csv')
-        df.to_csv(output_file, index=False)
-        print(f"Saved final progress to {output_file}")
+    if updates:
+        save_updates(updates)
+        print(f"Saved final {len(updates)} updates to {delta_file}")
+    print(f"Updated keywords of {update_count} movies, run delta_checkpoint.py to merge them into the dataset")
 
 
 # Example usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape missing keywords from IMDb")
+    parser.add_argument('--resume', action='store_true', help="skip movies the journal has already finished")
+    args = parser.parse_args()
+
     input_file = '../Datasets/clean.csv'
     output_dir = '../Datasets/Scraped_Chunks'
     os.makedirs(output_dir, exist_ok=True)  # Ensure the output directory exists
@@ -118,5 +134,10 @@ if __name__ == "__main__":
     end_line = 2000  # Inclusive
 
     start_time = time.time()
-    update_keywords_column(input_file, output_dir, start_line=start_line, end_line=end_line, batch_size=1000)
+    page_cache = PageCache('../Datasets/page_cache')
+    journal = ScrapeJournal(os.path.join(output_dir, 'keywords_journal.sqlite'))
+    update_keywords_column(input_file, output_dir, start_line=start_line, end_line=end_line, batch_size=1000,
+                           cache=page_cache, journal=journal, resume=args.resume)
+    journal.close()
+    page_cache.evict()
     print(f"Process completed in {time.time() - start_time:.2f} seconds")
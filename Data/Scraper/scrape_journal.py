@@ -0,0 +1,79 @@
+import json
+import sqlite3
+import time
+
+# Durable per-movie scrape journal in SQLite (WAL mode). Every attempt is recorded as soon as it
+# finishes, so a crashed or interrupted run can resume by skipping the ids that are already done
+# and retrying only the failed ones, up to max_attempts. Runs over different row ranges can share
+# one journal: a run that does not resume only forgets the ids of its own range.
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+class ScrapeJournal:
+    def __init__(self, path, max_attempts=3):
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS scrape_status (
+                imdb_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                fields TEXT,
+                data TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def record(self, imdb_id, movie_data=None, error=None):
+        """
+        Record one scrape attempt.
+
+        :param imdb_id: IMDb ID of the movie
+        :param movie_data: Scraped columns, None if the attempt failed
+        :param error: Optional failure description
+        """
+        status = DONE if movie_data is not None else FAILED
+        fields = ', '.join(movie_data) if movie_data else None
+        data = json.dumps(movie_data) if movie_data is not None else None
+        self.connection.execute("""
+            INSERT INTO scrape_status (imdb_id, status, fields, data, attempts, error, updated_at)
+            VALUES (?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(imdb_id) DO UPDATE SET
+                status = excluded.status,
+                fields = COALESCE(excluded.fields, scrape_status.fields),
+                data = COALESCE(excluded.data, scrape_status.data),
+                attempts = scrape_status.attempts + 1,
+                error = excluded.error,
+                updated_at = excluded.updated_at
+        """, (imdb_id, status, fields, data, error, time.time()))
+        self.connection.commit()
+
+    def skip_ids(self):
+        # ids a resumed run should not scrape again: finished, or failed too many times
+        rows = self.connection.execute(
+            "SELECT imdb_id FROM scrape_status WHERE status = ? OR attempts >= ?", (DONE, self.max_attempts))
+        return {imdb_id for imdb_id, in rows}
+
+    def scraped_data(self):
+        # imdb_id -> scraped columns of every finished movie
+        rows = self.connection.execute("SELECT imdb_id, data FROM scrape_status WHERE status = ?", (DONE,))
+        return {imdb_id: json.loads(data) for imdb_id, data in rows}
+
+    def forget(self, imdb_ids):
+        # drop the entries of the movies a fresh run scrapes again, the rest of the journal is kept
+        self.connection.executemany("DELETE FROM scrape_status WHERE imdb_id = ?",
+                                    ((imdb_id,) for imdb_id in imdb_ids))
+        self.connection.commit()
+
+    def summary(self):
+        rows = self.connection.execute("SELECT status, COUNT(*) FROM scrape_status GROUP BY status")
+        return dict(rows.fetchall())
+
+    def close(self):
+        self.connection.close()
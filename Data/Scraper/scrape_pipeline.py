@@ -0,0 +1,235 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import multiprocess_scraper
+from imdb_parsers import parse_embedded_json, parse_pages, plan_pages
+from page_cache import PageCache
+from rate_limiter import SharedRateLimiter
+
+# Staged scraping pipeline. Network I/O and HTML parsing run concurrently instead of taking turns
+# inside each worker:
+#
+#   fetch threads --(fetched queue)--> parse process pool --(parsed queue)--> single writer
+#
+# Both queues are bounded, so a slow stage applies back-pressure instead of buffering the whole run.
+# A monitor thread reports per-stage throughput and queue depth to show where the bottleneck is.
+
+STOP = None
+
+
+class StageMetrics:
+    def __init__(self, stages):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counts = {stage: 0 for stage in stages}
+
+    def add(self, stage, count=1):
+        with self.lock:
+            self.counts[stage] += count
+
+    def rates(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {stage: (count, count / elapsed) for stage, count in self.counts.items()}
+
+
+def parse_movie(index, imdb_id, pages):
+    # runs in the process pool: parse every fetched page of one movie
+    movie_data = {}
+    for page, html in pages.items():
+        try:
+            movie_data.update(parse_pages({page: html}))
+        except Exception as e:
+            print(f"    Couldn't parse {imdb_id} (Page: {page}): {e}")
+    return index, imdb_id, movie_data
+
+
+def fetch_worker(jobs, fetched, metrics):
+    session = multiprocess_scraper.create_retry_session(status_forcelist=(500, 502, 504))
+    while True:
+        job = jobs.get()
+        if job is STOP:
+            return
+        index, movie = job
+        imdb_id = movie['imdb_id']
+        pages = plan_pages(movie, use_json=multiprocess_scraper.USE_EMBEDDED_JSON)
+        responses = multiprocess_scraper.fetch_pages(session, imdb_id, pages)
+        # like process_movie: only fetch the other pages for columns the main page JSON could not fill.
+        # Reading the JSON blob is a json.loads, cheap enough for a fetch thread; the DOM parse stays in the pool
+        if 'main' in responses and multiprocess_scraper.USE_EMBEDDED_JSON:
+            found = parse_embedded_json(responses['main']) or {}
+            followup = [page for page in plan_pages(movie, found=found) if page not in pages]
+            if followup:
+                responses.update(multiprocess_scraper.fetch_pages(session, imdb_id, followup))
+        metrics.add('fetch')
+        fetched.put((index, imdb_id, responses))
+
+
+def parse_result(job):
+    index, imdb_id, future = job
+    try:
+        return future.result()
+    except Exception as e:
+        # e.g. a worker process died; the movie is written without scraped data
+        print(f"    Couldn't parse {imdb_id}: {e}")
+        return index, imdb_id, None
+
+
+def parse_dispatcher(fetched, parsed, executor, metrics, max_in_flight):
+    # hand fetched pages to the process pool, keeping at most max_in_flight parses outstanding
+    pending = deque()
+    try:
+        while True:
+            item = fetched.get()
+            if item is STOP:
+                break
+            index, imdb_id, responses = item
+            if not responses:
+                parsed.put((index, imdb_id, None))
+                continue
+            pending.append((index, imdb_id, executor.submit(parse_movie, index, imdb_id, responses)))
+            while len(pending) >= max_in_flight or (pending and pending[0][2].done()):
+                parsed.put(parse_result(pending.popleft()))
+                metrics.add('parse')
+
+        while pending:
+            parsed.put(parse_result(pending.popleft()))
+            metrics.add('parse')
+    finally:
+        # the writer must always be released, even if this thread fails
+        parsed.put(STOP)
+
+
+def writer(df_subset, parsed, output_file, metrics, complete_rows=(), flush_every=100):
+    # the only stage touching the output file: fill the scraped columns and append rows in batches.
+    # complete_rows needed no scraping and are written as they are, so the output covers the whole range
+    rows = [df_subset.loc[index] for index in complete_rows]
+    header = not os.path.exists(output_file)
+
+    def flush():
+        nonlocal rows, header
+        if rows:
+            pd.DataFrame(rows).to_csv(output_file, mode='a', header=header, index=False)
+            header = False
+            rows = []
+
+    while True:
+        item = parsed.get()
+        if item is STOP:
+            break
+        index, imdb_id, movie_data = item
+        movie = df_subset.loc[index].copy()
+        if movie_data:
+            for column, value in movie_data.items():
+                if column in movie and pd.isnull(movie[column]):
+                    movie[column] = value
+        else:
+            print(f"Skipping movie {imdb_id} due to scraping failure")
+        rows.append(movie)
+        metrics.add('write')
+        if len(rows) >= flush_every:
+            flush()
+    flush()
+
+
+def monitor(metrics, queues, done, interval):
+    while not done.wait(interval):
+        rates = ', '.join(f"{stage} {count} ({rate:.2f}/s)" for stage, (count, rate) in metrics.rates().items())
+        depths = ', '.join(f"{name} queue {q.qsize()}/{q.maxsize}" for name, q in queues.items())
+        print(f"[pipeline] {rates} | {depths}")
+
+
+def run_pipeline(input_file, output_file, **kwargs):
+    """
+    Scrape the missing columns of a range of rows through the staged pipeline.
+
+    :param input_file: Path to the input CSV file
+    :param output_file: CSV the updated rows are appended to
+    :param kwargs: start_line, end_line (inclusive), fetch_threads, parse_processes, queue_size,
+                   report_interval, limiter, cache and resume. Without resume the output file is started
+                   over; with it, movies already in the output file are skipped
+    :return: Final per-stage (count, rate) metrics
+    """
+    df = pd.read_csv(input_file)
+    start_line = kwargs.get('start_line', 0)
+    end_line = kwargs.get('end_line', len(df) - 1)
+    fetch_threads = kwargs.get('fetch_threads', 8)
+    parse_processes = kwargs.get('parse_processes', 4)
+    queue_size = kwargs.get('queue_size', 64)
+
+    multiprocess_scraper.init_worker(kwargs.get('limiter') or SharedRateLimiter(), kwargs.get('cache'))
+
+    df_subset = df.iloc[start_line:end_line + 1]
+    # every row is appended once, so the output file itself records which movies are done
+    if kwargs.get('resume') and os.path.exists(output_file):
+        written = set(pd.read_csv(output_file, usecols=['imdb_id'])['imdb_id'])
+        df_subset = df_subset[~df_subset['imdb_id'].isin(written)]
+        print(f"Resuming: {len(written)} movies already in {output_file}")
+    elif os.path.exists(output_file):
+        os.remove(output_file)
+    jobs = queue.Queue()
+    complete_rows = []
+    for index, movie in df_subset.iterrows():
+        if plan_pages(movie):
+            jobs.put((index, movie))
+        else:
+            complete_rows.append(index)
+    total = jobs.qsize()
+    for _ in range(fetch_threads):
+        jobs.put(STOP)
+
+    print(f"Pipeline scraping {total} movies from line {start_line} to {end_line}, "
+          f"{len(complete_rows)} need no scraping")
+    fetched = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue(maxsize=queue_size)
+    metrics = StageMetrics(('fetch', 'parse', 'write'))
+    done = threading.Event()
+
+    # spawn, not fork, since the pool starts its workers while the fetch threads are running
+    with ProcessPoolExecutor(parse_processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+        fetchers = [threading.Thread(target=fetch_worker, args=(jobs, fetched, metrics), daemon=True)
+                    for _ in range(fetch_threads)]
+        dispatcher = threading.Thread(target=parse_dispatcher,
+                                      args=(fetched, parsed, executor, metrics, 2 * parse_processes), daemon=True)
+        writer_thread = threading.Thread(target=writer, args=(df_subset, parsed, output_file, metrics, complete_rows),
+                                         daemon=True)
+        monitor_thread = threading.Thread(target=monitor, daemon=True,
+                                          args=(metrics, {'fetched': fetched, 'parsed': parsed}, done,
+                                                kwargs.get('report_interval', 10)))
+
+        for thread in fetchers + [dispatcher, writer_thread, monitor_thread]:
+            thread.start()
+        for thread in fetchers:
+            thread.join()
+        fetched.put(STOP)
+        dispatcher.join()
+        writer_thread.join()
+        done.set()
+
+    rates = metrics.rates()
+    for stage, (count, rate) in rates.items():
+        print(f"{stage}: {count} movies at {rate:.2f} movies/sec")
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape missing movie columns through the staged pipeline")
+    parser.add_argument('--resume', action='store_true', help="skip movies already in the output file")
+    args = parser.parse_args()
+
+    input_file = '../Datasets/clean.csv'
+    start_line = 100
+    end_line = 200  # inclusive
+    output_file = f'../Datasets/scraped_{start_line}_{end_line}.csv'
+    start = time.time()
+    page_cache = PageCache('../Datasets/page_cache')
+    run_pipeline(input_file, output_file, start_line=start_line, end_line=end_line, cache=page_cache,
+                 resume=args.resume)
+    page_cache.evict()
+    print(f"Took {time.time() - start} seconds to process {end_line - start_line + 1} movies")
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import time
+import numpy as np
+from feature_store import load_movies
+from movie_search import SEARCH_COLUMNS, search_vector, smallest_k, squared_distances
+
+# Inverted-file (IVF) approximate nearest neighbour index over the FilmFinder feature matrices.
+# Vectors are bucketed by their nearest coarse centroid, and a query only scans the `nprobe`
+# buckets closest to it, so neighbours just across a bucket boundary are still found.
+#
+# An index stores row positions, so a saved index also records the number of rows and a fingerprint
+# of the imdb_ids it was built over; an index that does not match the loaded movies is not used.
+
+
+def assign_lists(vectors, centroids, block_size=65536):
+    # nearest centroid for every vector, computed in blocks to bound memory
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        distances = centroid_norms - 2 * (block @ centroids.T)
+        assignments[start:start + block_size] = distances.argmin(axis=1)
+    return assignments
+
+
+def train_centroids(vectors, n_lists, iterations=20, sample_size=100000, seed=42):
+    """
+    Train coarse centroids with Lloyd's k-means on a random sample of the vectors.
+
+    :param vectors: (n, d) float32 matrix
+    :param n_lists: Number of centroids (inverted lists)
+    :param iterations: Number of k-means iterations
+    :param sample_size: Maximum number of vectors used for training
+    :param seed: Random seed
+    :return: (n_lists, d) float32 centroid matrix
+    """
+    rng = np.random.default_rng(seed)
+    # every list needs a distinct starting point from the sample
+    sample_size = max(sample_size, n_lists)
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = assign_lists(sample, centroids)
+        counts = np.bincount(assignments, minlength=n_lists)
+        sums = np.stack([
+            np.bincount(assignments, weights=sample[:, dim], minlength=n_lists)
+            for dim in range(sample.shape[1])
+        ], axis=1)
+
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # re-seed empty lists from random points so every list stays useful
+        if not filled.all():
+            centroids[~filled] = sample[rng.choice(len(sample), int((~filled).sum()), replace=False)]
+
+    return centroids
+
+
+def build_ivf_index(vectors, n_lists=None, **kwargs):
+    """
+    Build an IVF index over a feature matrix.
+
+    :param vectors: (n, d) float32 matrix, e.g. build_feature_matrices(df)['summary']['vectors']
+    :param n_lists: Number of inverted lists, defaults to sqrt(n)
+    :param kwargs: Passed to train_centroids()
+    :return: Dict holding the centroids and the vectors regrouped by list
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if n_lists is None:
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+    n_lists = min(n_lists, len(vectors))
+
+    centroids = train_centroids(vectors, n_lists, **kwargs)
+    assignments = assign_lists(vectors, centroids)
+
+    # regroup the rows list by list so every probe is one contiguous slice
+    order = np.argsort(assignments, kind='stable').astype(np.int64)
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignments, minlength=n_lists), out=offsets[1:])
+    grouped = vectors[order]
+
+    return {
+        'centroids': centroids,
+        'centroid_norms': np.einsum('ij,ij->i', centroids, centroids),
+        'order': order,
+        'offsets': offsets,
+        'vectors': grouped,
+        'norms': np.einsum('ij,ij->i', grouped, grouped),
+    }
+
+
+def default_nprobe(n_lists):
+    # sqrt(n_lists) lists, so the scanned share of the index shrinks as it grows, like the list size
+    return max(1, int(np.ceil(np.sqrt(n_lists))))
+
+
+def search_ivf(index, query, k=10, nprobe=None):
+    """
+    Approximate euclidean top-k search, scanning the `nprobe` lists nearest to the query.
+
+    :param index: Index returned by build_ivf_index() or load_ivf_index()
+    :param query: Query vector
+    :param k: Number of neighbours to return
+    :param nprobe: Number of inverted lists to scan, clamped to [1, number of lists]; higher is slower
+                   with better recall. Defaults to default_nprobe() of the index's list count
+    :return: (row positions in the original matrix, euclidean distances), nearest first
+    """
+    n_lists = len(index['centroids'])
+    nprobe = default_nprobe(n_lists) if nprobe is None else min(max(int(nprobe), 1), n_lists)
+    query = np.asarray(query, dtype=np.float32)
+    centroid_distances = squared_distances(index['centroids'], index['centroid_norms'], query)
+    lists = smallest_k(centroid_distances, nprobe)
+
+    offsets = index['offsets']
+    positions = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in lists])
+    distances = squared_distances(index['vectors'][positions], index['norms'][positions], query)
+    nearest = smallest_k(distances, k)
+    return index['order'][positions[nearest]], np.sqrt(distances[nearest])
+
+
+def row_fingerprint(imdb_ids):
+    # identifies the movies, in order, whose row positions an index holds
+    return hashlib.sha1('\n'.join(map(str, imdb_ids)).encode('utf-8')).hexdigest()
+
+
+def save_ivf_index(index, path, imdb_ids):
+    """
+    :param index: Index returned by build_ivf_index()
+    :param path: .npz file to write
+    :param imdb_ids: imdb_id of every row of the matrix the index was built over, in row order
+    """
+    np.savez(path, n_rows=np.array(len(imdb_ids)), row_fingerprint=np.array(row_fingerprint(imdb_ids)), **index)
+
+
+def index_matches(index, imdb_ids):
+    return ('row_fingerprint' in index and int(index['n_rows']) == len(imdb_ids)
+            and str(index['row_fingerprint']) == row_fingerprint(imdb_ids))
+
+
+def load_ivf_index(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def measure_recall(index, matrix, k=10, nprobes=(1, 4, 8, 16, 32), n_queries=1000, seed=0):
+    """
+    Compare the IVF index against exact search using rows of the matrix as queries.
+
+    :param index: IVF index over matrix['vectors']
+    :param matrix: One entry of build_feature_matrices()
+    :param k: Neighbours per query
+    :param nprobes: nprobe values to evaluate
+    :param n_queries: Number of sampled query rows
+    :param seed: Random seed
+    :return: List of dicts with nprobe, recall@k and mean per-query milliseconds
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(matrix['vectors']), min(n_queries, len(matrix['vectors'])), replace=False)
+    queries = matrix['vectors'][rows]
+
+    start = time.perf_counter()
+    exact = [set(search_vector(matrix, query, k)[0].tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = [{'nprobe': 'exact', 'recall': 1.0, 'ms_per_query': exact_ms}]
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        approximate = [search_ivf(index, query, k, nprobe)[0] for query in queries]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(len(truth.intersection(found.tolist())) for truth, found in zip(exact, approximate))
+        report.append({'nprobe': nprobe, 'recall': hits / (len(queries) * k), 'ms_per_query': elapsed_ms})
+    return report
+
+
+def index_path(index_dir, mode):
+    return os.path.join(index_dir, f"ivf_{mode}.npz")
+
+
+def load_ivf_indexes(index_dir, imdb_ids):
+    """
+    Load whichever per-mode indexes have been built; modes without one fall back to exact search.
+
+    :param index_dir: Directory holding the ivf_<mode>.npz files
+    :param imdb_ids: imdb_id of every loaded movie in row order; indexes built over other rows are skipped
+    :return: Dict of search mode -> index
+    """
+    indexes = {}
+    for mode in SEARCH_COLUMNS:
+        path = index_path(index_dir, mode)
+        if os.path.exists(path):
+            index = load_ivf_index(path)
+            if index_matches(index, imdb_ids):
+                indexes[mode] = index
+            else:
+                print(f"{path} was built over other movies, using exact {mode} search. Rebuild it with ann_index.py")
+    return indexes
+
+
+if __name__ == "__main__":
+    file_name = "movie_pickle.pkl"
+    store_dir = "feature_store"
+    index_dir = "."
+
+    df, matrices = load_movies(file_name, store_dir)
+
+    for mode, matrix in matrices.items():
+        start = time.time()
+        index = build_ivf_index(matrix['vectors'])
+        save_ivf_index(index, index_path(index_dir, mode), df['imdb_id'])
+        print(f"Built {mode} index with {len(index['centroids'])} lists in {time.time() - start:.2f} seconds")
+
+        for result in measure_recall(index, matrix):
+            print(f"    nprobe={result['nprobe']}: recall@10={result['recall']:.3f}, "
+                  f"{result['ms_per_query']:.2f} ms/query")
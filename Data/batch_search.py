@@ -0,0 +1,169 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from feature_store import load_movies
+from title_index import build_title_index, lookup_movie
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+def resolve_queries(title_index, queries):
+    """
+    Map titles / IMDb IDs to row positions. A title shared by several movies expands to all of them.
+
+    :param title_index: Index returned by build_title_index()
+    :param queries: Iterable of movie titles or IMDb IDs
+    :return: (array of row positions, list of queries that matched nothing)
+    """
+    rows = []
+    missing = []
+    for query in queries:
+        matches = lookup_movie(title_index, str(query))
+        if matches:
+            rows.extend(matches)
+        else:
+            missing.append(query)
+    return np.asarray(rows, dtype=np.int64), missing
+
+
+def take_rows(array, columns):
+    return np.take_along_axis(array, columns, axis=1)
+
+
+def block_top_k(queries, query_norms, vectors, norms, k, corpus_block=65536):
+    """
+    Exact top-k for a block of queries, tiling over the corpus so at most
+    len(queries) x corpus_block distances are held in memory at once.
+
+    :return: ((q, k) row positions, (q, k) euclidean distances), nearest first
+    """
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+
+    for start in range(0, len(vectors), corpus_block):
+        tile = vectors[start:start + corpus_block]
+        distances = norms[start:start + corpus_block][None, :] - 2 * (queries @ tile.T) + query_norms[:, None]
+
+        tile_k = min(k, distances.shape[1])
+        candidates = np.argpartition(distances, tile_k - 1, axis=1)[:, :tile_k]
+        best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+        best_distances = np.concatenate([best_distances, take_rows(distances, candidates)], axis=1)
+
+        # merge this tile's candidates with the running best
+        if best_rows.shape[1] > k:
+            keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+            best_rows = take_rows(best_rows, keep)
+            best_distances = take_rows(best_distances, keep)
+
+    order = np.argsort(best_distances, axis=1, kind='stable')
+    return take_rows(best_rows, order), np.sqrt(np.maximum(take_rows(best_distances, order), 0))
+
+
+def batch_top_k(matrix, rows, k=10, query_block=512, corpus_block=65536, exclude_self=True):
+    """
+    Yield the top-k neighbours of many movies, one block of queries at a time.
+
+    :param matrix: One entry of build_feature_matrices()
+    :param rows: Row positions of the query movies
+    :param k: Neighbours per movie
+    :param query_block: Number of queries per distance block
+    :param corpus_block: Number of corpus rows per distance block
+    :param exclude_self: Drop the query movie from its own neighbour list
+    :return: Generator of (query rows, (q, k) neighbour rows, (q, k) distances); k is clamped to the
+             number of other movies, so every row has the same number of neighbours
+    """
+    vectors, norms = matrix['vectors'], matrix['norms']
+    k = max(min(k, len(vectors) - 1 if exclude_self else len(vectors)), 0)
+    search_k = k + 1 if exclude_self else k
+
+    for start in range(0, len(rows), query_block):
+        block_rows = rows[start:start + query_block]
+        nearest, distances = block_top_k(vectors[block_rows], norms[block_rows], vectors, norms,
+                                         search_k, corpus_block)
+
+        if exclude_self:
+            # stable sort moves the query itself to the end, keeping the rest in distance order
+            keep = np.argsort(nearest == block_rows[:, None], axis=1, kind='stable')[:, :k]
+            nearest, distances = take_rows(nearest, keep), take_rows(distances, keep)
+
+        yield block_rows, nearest, distances
+
+
+def neighbours_frame(df, block_rows, nearest, distances):
+    # one output row per (query, neighbour) pair
+    k = nearest.shape[1]
+    query_rows = np.repeat(block_rows, k)
+    neighbour_rows = nearest.ravel()
+    return pd.DataFrame({
+        'imdb_id': df['imdb_id'].to_numpy()[query_rows],
+        'title': df['title'].to_numpy()[query_rows],
+        'rank': np.tile(np.arange(1, k + 1), len(block_rows)),
+        'similar_imdb_id': df['imdb_id'].to_numpy()[neighbour_rows],
+        'similar_title': df['title'].to_numpy()[neighbour_rows],
+        'distance': distances.ravel(),
+    })
+
+
+def find_similar_movies_batch(df, matrices, title_index, queries, mode, output_file, k=10, **kwargs):
+    """
+    Compute "more like this" lists for many movies and stream them to a CSV or Parquet file.
+
+    :param df: Movie dataframe loaded from movie_pickle.pkl
+    :param matrices: Result of build_feature_matrices(df)
+    :param title_index: Result of build_title_index(df)
+    :param queries: Movie titles or IMDb IDs
+    :param mode: 'genre', 'summary' or 'keywords'
+    :param output_file: Output path, written as Parquet if it ends in .parquet, otherwise CSV
+    :param k: Neighbours per movie
+    :param kwargs: query_block, corpus_block and exclude_self, passed to batch_top_k()
+    :return: List of queries that were not found
+    """
+    rows, missing = resolve_queries(title_index, queries)
+    for query in missing:
+        print(f"Movie '{query}' not found in the dataset!")
+
+    if output_file.endswith('.parquet') and pa is None:
+        raise ImportError("Writing Parquet output needs pyarrow")
+    if os.path.exists(output_file):
+        os.remove(output_file)
+
+    parquet_writer = None
+    written = 0
+    try:
+        for block_rows, nearest, distances in batch_top_k(matrices[mode], rows, k, **kwargs):
+            frame = neighbours_frame(df, block_rows, nearest, distances)
+            if output_file.endswith('.parquet'):
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(output_file, table.schema)
+                parquet_writer.write_table(table)
+            else:
+                frame.to_csv(output_file, mode='a', header=written == 0, index=False)
+            written += len(block_rows)
+            print(f"Wrote neighbours for {written}/{len(rows)} movies")
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    return missing
+
+
+if __name__ == "__main__":
+    file_name = "movie_pickle.pkl"
+    store_dir = "feature_store"
+    mode = "summary"
+    output_file = f"similar_by_{mode}.csv"
+
+    start = time.time()
+    df, matrices = load_movies(file_name, store_dir)
+    title_index = build_title_index(df)
+
+    # every movie in the catalog
+    queries = df['imdb_id'].dropna()
+    find_similar_movies_batch(df, matrices, title_index, queries, mode, output_file)
+    print(f"Took {time.time() - start:.2f} seconds to process {len(queries)} movies")
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pandas as pd
+from movie_search import SEARCH_COLUMNS, build_feature_matrices, stack_vectors
+
+# Columnar on-disk layout for the movie feature store:
+#
+#   <store_dir>/metadata.parquet          every non-vector column
+#   <store_dir>/<column>.npy              float32 (n, d) matrix per vector column
+#   <store_dir>/<column>_norms.npy        float32 (n,) squared row norms
+#
+# The .npy files are opened with mmap_mode='r', so loading is near-instant and worker
+# processes reading the same store share the page cache instead of each holding a copy.
+
+METADATA_FILE = "metadata.parquet"
+
+
+def write_feature_store(metadata, vectors, store_dir):
+    """
+    Write already packed vectors and their metadata to a feature store directory.
+
+    :param metadata: Dataframe of every non-vector column, one row per movie
+    :param vectors: Dict of vector column -> (n, d) matrix, rows aligned with metadata
+    :param store_dir: Output directory, created if missing
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    for column, matrix in vectors.items():
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        np.save(os.path.join(store_dir, f"{column}.npy"), matrix)
+        np.save(os.path.join(store_dir, f"{column}_norms.npy"), np.einsum('ij,ij->i', matrix, matrix))
+
+    metadata = metadata.reset_index(drop=True)
+    metadata.to_parquet(os.path.join(store_dir, METADATA_FILE), index=False)
+    print(f"Exported {len(metadata)} movies to {store_dir}")
+
+
+def export_feature_store(df, store_dir):
+    """
+    Write the movie dataframe to a feature store directory.
+
+    :param df: Movie dataframe as produced by NLP.ipynb (same columns as movie_pickle.pkl)
+    :param store_dir: Output directory, created if missing
+    """
+    vector_columns = [column for column in SEARCH_COLUMNS.values() if column in df.columns]
+    vectors = {column: stack_vectors(df[column]) for column in vector_columns}
+    write_feature_store(df.drop(columns=vector_columns), vectors, store_dir)
+
+
+def load_feature_store(store_dir, mmap=True):
+    """
+    Load a feature store written by export_feature_store().
+
+    :param store_dir: Feature store directory
+    :param mmap: Memory-map the vector files instead of reading them into memory
+    :return: (metadata dataframe, matrices) where matrices matches build_feature_matrices()
+    """
+    mmap_mode = 'r' if mmap else None
+    metadata = pd.read_parquet(os.path.join(store_dir, METADATA_FILE))
+
+    matrices = {}
+    for mode, column in SEARCH_COLUMNS.items():
+        path = os.path.join(store_dir, f"{column}.npy")
+        if os.path.exists(path):
+            matrices[mode] = {
+                'vectors': np.load(path, mmap_mode=mmap_mode),
+                'norms': np.load(os.path.join(store_dir, f"{column}_norms.npy"), mmap_mode=mmap_mode),
+            }
+    return metadata, matrices
+
+
+def load_movies(pickle_file="movie_pickle.pkl", store_dir="feature_store"):
+    # prefer the feature store, unless the pickle was written after it (the store is then stale) or
+    # the store has not been exported yet
+    metadata_path = os.path.join(store_dir, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        if not os.path.exists(pickle_file) or os.path.getmtime(metadata_path) >= os.path.getmtime(pickle_file):
+            print(f"Loading movies from the feature store {store_dir}")
+            return load_feature_store(store_dir)
+        print(f"{pickle_file} is newer than the feature store {store_dir}, loading the pickle")
+    else:
+        print(f"Loading movies from {pickle_file}")
+    df = pd.read_pickle(pickle_file)
+    return df, build_feature_matrices(df)
+
+
+if __name__ == "__main__":
+    # convert an existing pickle into a feature store
+    pickle_file = "movie_pickle.pkl"
+    store_dir = "feature_store"
+    export_feature_store(pd.read_pickle(pickle_file), store_dir)
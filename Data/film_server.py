@@ -0,0 +1,222 @@
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from FilmFinder import find_similar_movies, find_similar_to_vector
+from movie_search import SEARCH_COLUMNS
+from feature_store import load_movies
+from title_index import build_title_index, lookup_movie, describe_candidate
+from ann_index import load_ivf_indexes
+from model_artifacts import LazyEncoder, ModelArtifacts, artifact_versions
+from incremental_build import manifest_model_version
+
+# Long-running FilmFinder query server. The dataset and indexes are loaded once and shared by
+# every request thread. Queries for movies outside the dataset (free text, genres or keywords) are
+# encoded with the model artifacts the feature store was built with; the sentence encoder is only loaded by the first of them.
+#
+#   GET  /similar?movie=Inception&mode=summary&k=10
+#   POST /similar  {"movie": "tt1375666", "mode": "keywords", "k": 20}
+#   GET  /similar?text=a thief who steals secrets through dreams&mode=summary
+#   POST /similar  {"genres": "Action, Science Fiction", "mode": "genre"}
+#   GET  /stats    request counts and p50/p99 latency per mode
+
+
+class LatencyStats:
+    # keeps the most recent latencies per mode for percentile reporting
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.window = window
+        self.latencies = {}
+        self.counts = {}
+
+    def record(self, mode, seconds):
+        with self.lock:
+            self.latencies.setdefault(mode, deque(maxlen=self.window)).append(seconds * 1000)
+            self.counts[mode] = self.counts.get(mode, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            snapshot = {mode: list(values) for mode, values in self.latencies.items()}
+            counts = dict(self.counts)
+        return {
+            mode: {
+                'requests': counts[mode],
+                'p50_ms': float(np.percentile(values, 50)),
+                'p99_ms': float(np.percentile(values, 99)),
+            }
+            for mode, values in snapshot.items()
+        }
+
+
+# field a query for a movie outside the dataset needs for each search mode
+QUERY_FIELDS = {'genre': 'genres', 'summary': 'overview', 'keywords': 'keywords'}
+
+
+def load_artifacts(store_dir, artifact_dir):
+    # the artifact version recorded in the store's manifest, so queries land in the same space as the store
+    versions = artifact_versions(artifact_dir)
+    if not versions:
+        return None
+    version = manifest_model_version(store_dir)
+    if version is None:
+        print(f"{store_dir} records no model artifacts version, using the newest, {versions[-1]}")
+    elif version not in versions:
+        print(f"Model artifacts version {version} of {store_dir} is missing, queries outside the dataset are disabled")
+        return None
+    return ModelArtifacts(artifact_dir, version)
+
+
+def load_search_state(file_name, index_dir=".", store_dir="feature_store", artifact_dir="model_artifacts"):
+    df, matrices = load_movies(file_name, store_dir)
+    return {
+        'df': df,
+        'matrices': matrices,
+        'title_index': build_title_index(df),
+        'indexes': load_ivf_indexes(index_dir, df['imdb_id']),
+        'artifacts': load_artifacts(store_dir, artifact_dir),
+        'embed': LazyEncoder(),
+        'stats': LatencyStats(),
+    }
+
+
+def format_results(similar_movies):
+    return [
+        {'imdb_id': imdb_id, 'title': title, 'distance': float(distance)}
+        for imdb_id, title, distance in zip(similar_movies['imdb_id'], similar_movies['title'],
+                                            similar_movies['distance'])
+    ]
+
+
+def answer_vector_query(state, params, mode, k):
+    # a movie that is not in the dataset, described by its overview ('text'), genres or keywords
+    if state['artifacts'] is None:
+        return 503, {'error': "no model artifacts loaded, only movies in the dataset can be searched"}
+    field = QUERY_FIELDS[mode]
+    value = params.get(field) or (params.get('text') if mode == 'summary' else None)
+    if not value:
+        return 400, {'error': f"mode '{mode}' needs '{field}'" + (" or 'text'" if mode == 'summary' else "")}
+    # JSON bodies may list genres or keywords, ["Action", "Drama"] means "Action, Drama"
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        value = ", ".join(value)
+    if not isinstance(value, str):
+        return 400, {'error': f"'{field}' must be a string or a list of strings"}
+
+    start = time.perf_counter()
+    query = state['artifacts'].encode_movie({field: value}, state['embed'])[mode]
+    similar_movies = find_similar_to_vector(query, state['df'], state['matrices'], mode, k, state['indexes'])
+    state['stats'].record(mode, time.perf_counter() - start)
+
+    return 200, {'query': value, 'mode': mode, 'results': format_results(similar_movies)}
+
+
+def answer_query(state, params):
+    """
+    Answer one similarity request.
+
+    :param state: Result of load_search_state()
+    :param params: Dict with 'movie' (title or IMDb ID), optional 'mode', 'k' and 'year'. Instead of
+                   'movie', a movie outside the dataset can be given as 'text'/'overview', 'genres'
+                   or 'keywords', matching the mode
+    :return: (HTTP status, JSON-serializable body)
+    """
+    movie = params.get('movie')
+    mode = str(params.get('mode', 'summary')).lower()
+    if mode not in SEARCH_COLUMNS:
+        return 400, {'error': f"mode must be one of {', '.join(SEARCH_COLUMNS)}"}
+    try:
+        k = int(params.get('k', 10))
+        year = int(params['year']) if params.get('year') else None
+    except (TypeError, ValueError):
+        return 400, {'error': "'k' and 'year' must be integers"}
+    if k < 1:
+        return 400, {'error': "'k' must be at least 1"}
+    # asking for more neighbours than there are movies returns the whole catalog
+    k = min(k, len(state['df']))
+    if not movie:
+        if any(params.get(field) for field in ('text', *QUERY_FIELDS.values())):
+            return answer_vector_query(state, params, mode, k)
+        return 400, {'error': "missing 'movie'"}
+
+    df, title_index = state['df'], state['title_index']
+    rows = lookup_movie(title_index, str(movie), year)
+    if not rows:
+        return 404, {'error': f"Movie '{movie}' not found in the dataset!"}
+    if len(rows) > 1:
+        return 300, {'candidates': [
+            {'imdb_id': df['imdb_id'].iat[row], 'description': describe_candidate(df, title_index, row)}
+            for row in rows
+        ]}
+
+    start = time.perf_counter()
+    similar_movies = find_similar_movies(rows[0], df, state['matrices'], mode, k, state['indexes'])
+    state['stats'].record(mode, time.perf_counter() - start)
+
+    return 200, {
+        'movie': df['title'].iat[rows[0]],
+        'imdb_id': df['imdb_id'].iat[rows[0]],
+        'mode': mode,
+        'results': format_results(similar_movies),
+    }
+
+
+def make_handler(state):
+    class FilmFinderHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stats':
+                self.send_json(200, state['stats'].summary())
+            elif url.path == '/similar':
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                self.send_json(*answer_query(state, params))
+            else:
+                self.send_json(404, {'error': f"unknown path {url.path}"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/similar':
+                self.send_json(404, {'error': f"unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                params = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self.send_json(400, {'error': "body must be JSON"})
+                return
+            if not isinstance(params, dict):
+                self.send_json(400, {'error': "body must be a JSON object"})
+                return
+            self.send_json(*answer_query(state, params))
+
+        def log_message(self, format, *args):
+            pass
+
+    return FilmFinderHandler
+
+
+def serve(file_name, host='127.0.0.1', port=8000, index_dir="."):
+    start = time.time()
+    state = load_search_state(file_name, index_dir)
+    print(f"Loaded {len(state['df'])} movies in {time.time() - start:.2f} seconds")
+
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    print(f"FilmFinder server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve("movie_pickle.pkl")
@@ -0,0 +1,244 @@
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from ann_index import build_ivf_index, index_matches, index_path, load_ivf_index, save_ivf_index
+from feature_store import load_feature_store, write_feature_store
+from model_artifacts import ModelArtifacts, artifact_versions, project, save_artifacts
+from movie_search import SEARCH_COLUMNS
+from overview_embedding import EmbeddingCache, SENTENCE_ENCODER_URL, embed_texts, load_sentence_encoder
+from token_vectors import combine_token_vectors, explode_tokens, token_incidence
+
+# Incremental rebuild of the feature store produced by NLP.ipynb. Every movie is hashed on the
+# columns its vectors come from; a rebuild diffs the new dataset against the previous build by
+# imdb_id and hash, copies the vectors of unchanged movies, and only encodes the changed ones.
+# Those go through the PCA projections and vocabulary tables of the store's model artifacts and are
+# assigned to their nearest KMeans centroids. refit=True redoes the full fit like the notebook.
+#
+# Besides the feature store files the build directory holds manifest.parquet, the imdb_id and
+# content hash of every movie in the build and the artifact version its vectors were encoded with.
+# The models are saved as versioned artifacts, see model_artifacts.py, and a new version is written
+# whenever a build changes them.
+
+MANIFEST_FILE = "manifest.parquet"
+FEATURE_COLUMNS = ('genres', 'overview', 'keywords')
+CLUSTER_COLUMNS = {'summary': 'overview_cluster', 'genre': 'genre_cluster', 'keywords': 'keyword_cluster'}
+PCA_COMPONENTS = {'genre': 2, 'summary': 100, 'keywords': 4}
+N_CLUSTERS = 10
+
+
+def content_hashes(df):
+    return pd.util.hash_pandas_object(df[list(FEATURE_COLUMNS)], index=False).to_numpy()
+
+
+def nearest_centroid(vectors, centroids):
+    distances = (np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2 * (vectors @ centroids.T))
+    return distances.argmin(axis=1)
+
+
+def fit_pca(vectors, n_components):
+    from sklearn.decomposition import PCA
+    pca = PCA(n_components=n_components).fit(vectors)
+    return pca.mean_.astype(np.float32), pca.components_.astype(np.float32)
+
+
+def fit_centroids(vectors, n_clusters=N_CLUSTERS):
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(np.asarray(vectors, dtype=np.float64))
+    return kmeans.cluster_centers_.astype(np.float32)
+
+
+def extend_vocabulary(models, mode, exploded, embed, cache):
+    # embed tokens the vocabulary has not seen and project them through the saved PCA
+    tokens = models[f'{mode}_tokens']
+    unique = pd.unique(exploded.to_numpy())
+    unseen = sorted(unique[pd.Index(tokens).get_indexer(unique) < 0].tolist())
+    if unseen:
+        projected = project(embed_texts(unseen, embed, cache), models[f'{mode}_pca_mean'],
+                            models[f'{mode}_pca_components'])
+        models[f'{mode}_tokens'] = np.concatenate([tokens, np.array(unseen)])
+        models[f'{mode}_table'] = np.concatenate([models[f'{mode}_table'], projected])
+        print(f"Added {len(unseen)} new {mode} tokens to the vocabulary")
+
+
+def encode_movies(df, models, embed, cache=None):
+    """
+    Encode movies with already fitted models.
+
+    :param df: Movies to encode
+    :param models: Dict from fit_models() or ModelArtifacts.models(), new tokens are added to it
+    :param embed: Callable mapping a list of strings to an (n, d) array
+    :param cache: Optional EmbeddingCache for overviews and new tokens
+    :return: Dict of vector column -> (len(df), d) float32 matrix
+    """
+    if df.empty:
+        return {SEARCH_COLUMNS['genre']: np.zeros((0, models['genre_table'].shape[1]), dtype=np.float32),
+                SEARCH_COLUMNS['keywords']: np.zeros((0, models['keywords_table'].shape[1]), dtype=np.float32),
+                SEARCH_COLUMNS['summary']: np.zeros((0, len(models['summary_pca_components'])), dtype=np.float32)}
+    vectors = {}
+    for mode, column in (('genre', 'genres'), ('keywords', 'keywords')):
+        exploded = explode_tokens(df[column])
+        extend_vocabulary(models, mode, exploded, embed, cache)
+        incidence = token_incidence(exploded, len(df), models[f'{mode}_tokens'])
+        vectors[SEARCH_COLUMNS[mode]] = combine_token_vectors(incidence, models[f'{mode}_table'])
+
+    embedded = embed_texts(df['overview'].tolist(), embed, cache)
+    vectors[SEARCH_COLUMNS['summary']] = project(embedded, models['summary_pca_mean'], models['summary_pca_components'])
+    return vectors
+
+
+def fit_models(df, embed, cache=None, n_clusters=N_CLUSTERS):
+    """
+    Full fit of the notebook pipeline: vocabulary PCAs, overview PCA and one KMeans per search mode.
+
+    :return: (models, vectors) where vectors is the encoding of df
+    """
+    models = {}
+    vectors = {}
+    for mode, column in (('genre', 'genres'), ('keywords', 'keywords')):
+        exploded = explode_tokens(df[column])
+        tokens = np.array(sorted(pd.unique(exploded.to_numpy())))
+        embedded = embed_texts(tokens.tolist(), embed, cache)
+        models[f'{mode}_pca_mean'], models[f'{mode}_pca_components'] = fit_pca(embedded, PCA_COMPONENTS[mode])
+        models[f'{mode}_tokens'] = tokens
+        models[f'{mode}_table'] = project(embedded, models[f'{mode}_pca_mean'], models[f'{mode}_pca_components'])
+        incidence = token_incidence(exploded, len(df), tokens)
+        vectors[SEARCH_COLUMNS[mode]] = combine_token_vectors(incidence, models[f'{mode}_table'])
+
+    embedded = embed_texts(df['overview'].tolist(), embed, cache)
+    models['summary_pca_mean'], models['summary_pca_components'] = fit_pca(embedded, PCA_COMPONENTS['summary'])
+    vectors[SEARCH_COLUMNS['summary']] = project(embedded, models['summary_pca_mean'], models['summary_pca_components'])
+
+    for mode, column in SEARCH_COLUMNS.items():
+        models[f'{mode}_centroids'] = fit_centroids(vectors[column], n_clusters)
+    return models, vectors
+
+
+def write_manifest(store_dir, imdb_ids, hashes, model_version):
+    pd.DataFrame({'imdb_id': imdb_ids, 'content_hash': hashes, 'model_version': model_version}).to_parquet(
+        os.path.join(store_dir, MANIFEST_FILE), index=False)
+
+
+def manifest_model_version(store_dir):
+    # artifact version the store's vectors and clusters were built with, None if it is not recorded
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    manifest = pd.read_parquet(path)
+    if 'model_version' not in manifest.columns or manifest.empty:
+        return None
+    return int(manifest['model_version'].iat[0])
+
+
+def refresh_ivf_indexes(index_dir, vectors, imdb_ids, changed):
+    # rebuild the IVF indexes the build made stale: their vectors changed or their rows moved
+    for mode, column in SEARCH_COLUMNS.items():
+        path = index_path(index_dir, mode)
+        if not os.path.exists(path) or (not changed and index_matches(load_ivf_index(path), imdb_ids)):
+            continue
+        start = time.time()
+        save_ivf_index(build_ivf_index(vectors[column]), path, imdb_ids)
+        print(f"Rebuilt the {mode} IVF index in {time.time() - start:.2f} seconds")
+
+
+def replace_directory(temp_dir, store_dir):
+    # swap the finished build in, so a crash never leaves a half-written store
+    old_dir = f"{store_dir}.old"
+    if os.path.exists(store_dir):
+        os.replace(store_dir, old_dir)
+    os.replace(temp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def build_feature_store(df, store_dir, embed, cache=None, refit=False, artifact_dir="model_artifacts", index_dir=None):
+    """
+    Build the feature store, re-encoding only the movies whose genres, overview or keywords changed.
+
+    :param df: Scraped dataset; movies without genres or overview are dropped like in NLP.ipynb
+    :param store_dir: Feature store directory, updated in place
+    :param embed: Callable mapping a list of strings to an (n, d) array
+    :param cache: Optional EmbeddingCache
+    :param refit: Refit every model on the whole dataset instead of reusing the previous build
+    :param artifact_dir: Directory of the versioned model artifacts
+    :param index_dir: Directory of the IVF indexes from ann_index.py, existing ones are rebuilt when stale
+    :return: Number of movies that were (re-)encoded
+    """
+    df = df.dropna(subset=['genres', 'overview']).drop_duplicates('imdb_id').reset_index(drop=True)
+    hashes = content_hashes(df)
+    model_version = manifest_model_version(store_dir)
+    previous = model_version in artifact_versions(artifact_dir) and not refit
+    if model_version is not None and not previous and not refit:
+        print(f"Model artifacts version {model_version} of {store_dir} is missing, refitting")
+
+    if previous:
+        old_metadata, old_matrices = load_feature_store(store_dir)
+        manifest = pd.read_parquet(os.path.join(store_dir, MANIFEST_FILE))
+        # the models that produced the stored vectors, not simply the newest ones
+        models = ModelArtifacts(artifact_dir, model_version).models()
+        vocabulary_sizes = [len(models[f'{mode}_tokens']) for mode in ('genre', 'keywords')]
+
+        old_rows = pd.Series(np.arange(len(manifest)), index=manifest['imdb_id'])
+        positions = df['imdb_id'].map(old_rows)
+        found = positions.notna().to_numpy()
+        positions = positions.fillna(0).astype(np.int64).to_numpy()
+        unchanged = found & (manifest['content_hash'].to_numpy()[positions] == hashes)
+        changed = np.flatnonzero(~unchanged)
+
+        vectors = {}
+        new_vectors = encode_movies(df.iloc[changed], models, embed, cache)
+        for mode, column in SEARCH_COLUMNS.items():
+            old_vectors = old_matrices[mode]['vectors']
+            matrix = np.empty((len(df), old_vectors.shape[1]), dtype=np.float32)
+            matrix[unchanged] = old_vectors[positions[unchanged]]
+            matrix[changed] = new_vectors[column]
+            vectors[column] = matrix
+
+        clusters = {}
+        for mode, cluster_column in CLUSTER_COLUMNS.items():
+            labels = np.empty(len(df), dtype=np.int64)
+            labels[unchanged] = old_metadata[cluster_column].to_numpy()[positions[unchanged]]
+            labels[changed] = nearest_centroid(new_vectors[SEARCH_COLUMNS[mode]], models[f'{mode}_centroids'])
+            clusters[cluster_column] = labels
+        print(f"{len(changed)} of {len(df)} movies new or changed, {len(manifest) - found.sum()} removed")
+        models_changed = vocabulary_sizes != [len(models[f'{mode}_tokens']) for mode in ('genre', 'keywords')]
+    else:
+        models, vectors = fit_models(df, embed, cache)
+        clusters = {cluster_column: nearest_centroid(vectors[SEARCH_COLUMNS[mode]], models[f'{mode}_centroids'])
+                    for mode, cluster_column in CLUSTER_COLUMNS.items()}
+        changed = np.arange(len(df))
+        print(f"Fitted every model on {len(df)} movies")
+        models_changed = True
+
+    metadata = df.drop(columns=[column for column in SEARCH_COLUMNS.values() if column in df.columns])
+    metadata = metadata.assign(**clusters)
+
+    if models_changed:
+        model_version = save_artifacts(models, artifact_dir)
+
+    temp_dir = f"{store_dir}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    write_feature_store(metadata, vectors, temp_dir)
+    write_manifest(temp_dir, df['imdb_id'], hashes, model_version)
+    if cache is not None:
+        cache.save()
+    # the old store is memory-mapped above, drop it before the directories are swapped
+    if previous:
+        del old_metadata, old_matrices
+    replace_directory(temp_dir, store_dir)
+    if index_dir is not None:
+        refresh_ivf_indexes(index_dir, vectors, df['imdb_id'], len(changed) > 0)
+    return len(changed)
+
+
+if __name__ == "__main__":
+    input_file = "../Datasets/scraped_merged.csv"
+    store_dir = "feature_store"
+    index_dir = "."
+    refit = False  # the first build, without a manifest, always does the full fit
+
+    start = time.time()
+    cache = EmbeddingCache("../Datasets/overview_embeddings.npz", SENTENCE_ENCODER_URL)
+    encoded = build_feature_store(pd.read_csv(input_file), store_dir, load_sentence_encoder(), cache, refit=refit,
+                                  index_dir=index_dir)
+    print(f"Encoded {encoded} movies in {time.time() - start:.2f} seconds")
@@ -0,0 +1,169 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+from overview_embedding import SENTENCE_ENCODER_URL, load_sentence_encoder
+from token_vectors import combine_token_vectors, explode_tokens, token_incidence
+
+# Versioned bundle of everything needed to encode a query the way NLP.ipynb encoded the dataset:
+#
+#   <artifact_dir>/models_v0001.npz, models_v0002.npz, ...
+#
+# Each file holds, per search mode (genre, summary, keywords), the PCA mean and components and the
+# KMeans centroids, plus the genre and keyword vocabulary tables (token -> projected vector). A new
+# version is written whenever the models change; readers open the newest one unless told otherwise.
+# Arrays are only read from the file when first used, and every PCA is folded into one weight
+# matrix and bias so projecting a query is a single matrix multiply.
+
+ARTIFACT_FORMAT = 1
+ARTIFACT_PATTERN = re.compile(r'^models_v(\d+)\.npz$')
+TOKEN_COLUMNS = {'genre': 'genres', 'keywords': 'keywords'}
+
+
+def artifact_versions(artifact_dir):
+    if not os.path.isdir(artifact_dir):
+        return []
+    return sorted(int(match.group(1)) for match in map(ARTIFACT_PATTERN.match, os.listdir(artifact_dir)) if match)
+
+
+def artifact_path(artifact_dir, version):
+    return os.path.join(artifact_dir, f"models_v{version:04d}.npz")
+
+
+def save_artifacts(models, artifact_dir, embed_model=SENTENCE_ENCODER_URL):
+    """
+    Write the models as the next artifact version.
+
+    :param models: Dict of array name -> array, e.g. from incremental_build.fit_models()
+    :param artifact_dir: Artifact directory, created if missing
+    :param embed_model: Name of the sentence encoder the PCAs were fitted on
+    :return: The new version number
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    versions = artifact_versions(artifact_dir)
+    version = versions[-1] + 1 if versions else 1
+    path = artifact_path(artifact_dir, version)
+    temp_path = f"{path}.tmp.npz"
+    np.savez(temp_path, artifact_format=np.array(ARTIFACT_FORMAT), embed_model=np.array(embed_model),
+             created=np.array(time.time()), **models)
+    os.replace(temp_path, path)
+    print(f"Saved model artifacts version {version} to {path}")
+    return version
+
+
+def pca_projection(mean, components):
+    # (x - mean) @ components.T == x @ weights + bias
+    weights = np.ascontiguousarray(components.T, dtype=np.float32)
+    return weights, (-mean.astype(np.float32) @ weights)
+
+
+def project(vectors, mean, components):
+    weights, bias = pca_projection(mean, components)
+    return np.asarray(vectors, dtype=np.float32) @ weights + bias
+
+
+class ModelArtifacts:
+    def __init__(self, artifact_dir, version=None):
+        """
+        :param artifact_dir: Directory written by save_artifacts()
+        :param version: Version to open, None for the newest
+        """
+        versions = artifact_versions(artifact_dir)
+        if not versions:
+            raise FileNotFoundError(f"No model artifacts in {artifact_dir}")
+        self.version = versions[-1] if version is None else version
+        self.path = artifact_path(artifact_dir, self.version)
+        self.lock = threading.Lock()
+        self.file = None
+        self.arrays = {}
+        self.projections = {}
+
+    def npz(self):
+        # the artifact file, opened and checked on first use
+        with self.lock:
+            if self.file is None:
+                self.file = np.load(self.path)
+                if int(self.file['artifact_format']) != ARTIFACT_FORMAT:
+                    raise ValueError(f"{self.path} has format {self.file['artifact_format']}, "
+                                     f"expected {ARTIFACT_FORMAT}")
+            return self.file
+
+    def __getitem__(self, name):
+        npz = self.npz()
+        with self.lock:
+            if name not in self.arrays:
+                self.arrays[name] = npz[name]
+            return self.arrays[name]
+
+    def models(self):
+        # every model array, e.g. to continue an incremental build
+        return {name: self[name] for name in self.npz().files
+                if name not in ('artifact_format', 'embed_model', 'created')}
+
+    def projection(self, mode):
+        if mode not in self.projections:
+            self.projections[mode] = pca_projection(self[f'{mode}_pca_mean'], self[f'{mode}_pca_components'])
+        return self.projections[mode]
+
+    def project(self, mode, vectors):
+        weights, bias = self.projection(mode)
+        return np.asarray(vectors, dtype=np.float32) @ weights + bias
+
+    def encode_text(self, texts, embed):
+        # overview-space vectors of free text, comparable with the 'summary' search matrix
+        return self.project('summary', embed(list(texts)))
+
+    def encode_tokens(self, mode, values, embed):
+        """
+        Combined genre or keyword vectors of comma separated token strings.
+
+        :param mode: 'genre' or 'keywords'
+        :param values: Series of "Drama, Crime" strings
+        :param embed: Sentence encoder, only called for tokens missing from the vocabulary
+        :return: float32 (len(values), d) matrix
+        """
+        tokens, table = self[f'{mode}_tokens'], self[f'{mode}_table']
+        exploded = explode_tokens(values)
+        unique = pd.unique(exploded.to_numpy())
+        unseen = unique[pd.Index(tokens).get_indexer(unique) < 0].tolist()
+        if unseen:
+            tokens = np.concatenate([tokens, np.array(unseen)])
+            table = np.concatenate([table, self.project(mode, embed(unseen))])
+        return combine_token_vectors(token_incidence(exploded, len(values), tokens), table)
+
+    def encode_movie(self, movie, embed):
+        """
+        Search vectors of a movie that is not in the dataset.
+
+        :param movie: Dict with any of 'genres', 'keywords' (comma separated) and 'overview'
+        :param embed: Sentence encoder
+        :return: Dict of search mode -> vector, for the fields the movie has
+        """
+        vectors = {}
+        for mode, column in TOKEN_COLUMNS.items():
+            if movie.get(column):
+                vectors[mode] = self.encode_tokens(mode, pd.Series([movie[column]]), embed)[0]
+        if movie.get('overview'):
+            vectors['summary'] = self.encode_text([movie['overview']], embed)[0]
+        return vectors
+
+    def nearest_cluster(self, mode, vectors):
+        centroids = self[f'{mode}_centroids']
+        distances = np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2 * (np.atleast_2d(vectors) @ centroids.T)
+        return distances.argmin(axis=1)
+
+
+class LazyEncoder:
+    # loads the sentence encoder on the first call, so a server only pays for it if a query needs it
+    def __init__(self, loader=load_sentence_encoder):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.model = None
+
+    def __call__(self, texts):
+        with self.lock:
+            if self.model is None:
+                self.model = self.loader()
+        return np.asarray(self.model(texts), dtype=np.float32)
@@ -0,0 +1,68 @@
+import numpy as np
+
+# vector column in movie_pickle.pkl used for each search mode
+SEARCH_COLUMNS = {
+    'genre': 'combined_genres',
+    'summary': 'embedded_overview',
+    'keywords': 'combined_keywords',
+}
+
+
+def stack_vectors(column):
+    # pack a column of per-movie lists/arrays into one contiguous float32 matrix
+    matrix = np.stack(column.to_numpy()).astype(np.float32, copy=False)
+    return np.ascontiguousarray(matrix)
+
+
+def build_feature_matrices(df):
+    """
+    Pack every search column of the movie dataframe into float32 matrices once.
+
+    :param df: Movie dataframe loaded from movie_pickle.pkl
+    :return: Dict of mode -> {'vectors': (n, d) matrix, 'norms': (n,) squared row norms}
+    """
+    matrices = {}
+    for mode, column in SEARCH_COLUMNS.items():
+        vectors = stack_vectors(df[column])
+        matrices[mode] = {
+            'vectors': vectors,
+            'norms': np.einsum('ij,ij->i', vectors, vectors),
+        }
+    return matrices
+
+
+def squared_distances(vectors, norms, query):
+    # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, computed for every row in one pass
+    query = np.asarray(query, dtype=np.float32)
+    distances = norms - 2 * (vectors @ query) + np.dot(query, query)
+    np.maximum(distances, 0, out=distances)
+    return distances
+
+
+def smallest_k(distances, k):
+    # indices of the k smallest distances, sorted nearest first
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    nearest = np.argpartition(distances, k - 1)[:k]
+    return nearest[np.argsort(distances[nearest], kind='stable')]
+
+
+def search_vector(matrix, query, k=10):
+    """
+    Exact euclidean top-k search of a query vector against one feature matrix.
+
+    :param matrix: One entry of build_feature_matrices()
+    :param query: Query vector with the same dimension as the matrix
+    :param k: Number of neighbours to return
+    :return: (row positions, euclidean distances), nearest first
+    """
+    distances = squared_distances(matrix['vectors'], matrix['norms'], query)
+    nearest = smallest_k(distances, k)
+    return nearest, np.sqrt(distances[nearest])
+
+
+def search_row(matrices, mode, row, k=10):
+    # top-k neighbours of the movie at row position `row`, itself included
+    matrix = matrices[mode]
+    return search_vector(matrix, matrix['vectors'][row], k)
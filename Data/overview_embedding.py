@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Batched sentence embedding of movie overviews with an on-disk cache keyed by the SHA-1 of each text.
+# Encoding one overview per model call is the slowest step of the NLP.ipynb rebuild; here every
+# distinct text is embedded once, in large batches, and later runs only embed new or changed texts.
+#
+# embed is any callable mapping a list of strings to an (n, d) array, e.g. the Universal Sentence
+# Encoder from load_sentence_encoder() or the small local HashingEmbedder stand-in.
+
+SENTENCE_ENCODER_URL = "https://tfhub.dev/google/universal-sentence-encoder/4"
+
+
+def load_sentence_encoder(url=SENTENCE_ENCODER_URL):
+    import tensorflow_hub as hub
+    return hub.load(url)
+
+
+class HashingEmbedder:
+    # Deterministic bag-of-words stand-in for the sentence encoder: every token is hashed to a
+    # signed coordinate, and the sum is L2-normalised. Needs no download and runs anywhere.
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest()[:8], 'little')
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_file, model_name):
+        """
+        :param cache_file: .npz file holding the cached vectors, created by save()
+        :param model_name: Identifies the model; a cache written by another model is ignored
+        """
+        self.cache_file = cache_file
+        self.model_name = model_name
+        self.rows = {}
+        self.vectors = []
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                if str(data['model_name']) == model_name:
+                    self.rows = {digest: row for row, digest in enumerate(data['hashes'].tolist())}
+                    self.vectors = list(data['vectors'])
+                else:
+                    print(f"Ignoring {cache_file}, it was written by {data['model_name']}")
+        self.saved = len(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, digest):
+        row = self.rows.get(digest)
+        return None if row is None else self.vectors[row]
+
+    def put(self, digests, vectors):
+        for digest, vector in zip(digests, vectors):
+            if digest not in self.rows:
+                self.rows[digest] = len(self.vectors)
+                self.vectors.append(vector)
+
+    def save(self):
+        if len(self.rows) == self.saved:
+            return
+        hashes = np.array(list(self.rows), dtype='U40')
+        vectors = np.stack(self.vectors).astype(np.float32)
+        # np.savez appends .npz to names without it, so the temporary file keeps the suffix
+        temp_file = f"{self.cache_file}.tmp.npz"
+        np.savez(temp_file, model_name=np.array(self.model_name), hashes=hashes, vectors=vectors)
+        os.replace(temp_file, self.cache_file)
+        self.saved = len(self.rows)
+        print(f"Saved {len(self.rows)} cached embeddings to {self.cache_file}")
+
+
+def embed_texts(texts, embed, cache=None, batch_size=512):
+    """
+    Embed a list of texts in batches, reusing cached vectors.
+
+    :param texts: List of strings
+    :param embed: Callable mapping a list of strings to an (n, d) array
+    :param cache: Optional EmbeddingCache, updated with the new vectors
+    :param batch_size: Texts per model call
+    :return: float32 (len(texts), d) matrix
+    """
+    digests = [text_hash(text) for text in texts]
+    vectors = {}
+    if cache is not None:
+        for digest in digests:
+            vector = cache.get(digest)
+            if vector is not None:
+                vectors[digest] = vector
+
+    # every distinct uncached text is embedded once, however often it appears
+    missing = {}
+    for digest, text in zip(digests, texts):
+        if digest not in vectors:
+            missing.setdefault(digest, text)
+    missing_digests = list(missing)
+    for start in range(0, len(missing_digests), batch_size):
+        batch = missing_digests[start:start + batch_size]
+        embedded = np.asarray(embed([missing[digest] for digest in batch]), dtype=np.float32)
+        vectors.update(zip(batch, embedded))
+        if cache is not None:
+            cache.put(batch, embedded)
+
+    print(f"Embedded {len(missing_digests)} texts, {len(texts) - len(missing_digests)} from the cache or repeated")
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vectors[digest] for digest in digests])
+
+
+def encode_overviews(overviews, embed, cache=None, batch_size=512):
+    """
+    Batched replacement of NLP.ipynb's encode_overview() applied row by row.
+
+    :param overviews: Series of overviews
+    :param embed: Callable mapping a list of strings to an (n, d) array
+    :param cache: Optional EmbeddingCache
+    :param batch_size: Texts per model call
+    :return: Series of float32 vectors, None where the overview is not a string
+    """
+    is_text = overviews.map(lambda overview: isinstance(overview, str)).to_numpy()
+    matrix = embed_texts(overviews[is_text].tolist(), embed, cache, batch_size)
+    encoded = pd.Series([None] * len(overviews), index=overviews.index, dtype=object)
+    encoded[is_text] = pd.Series(list(matrix), index=overviews.index[is_text], dtype=object)
+    return encoded
@@ -0,0 +1,158 @@
+import os
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from feature_store import METADATA_FILE, load_feature_store
+from incremental_build import CLUSTER_COLUMNS, MANIFEST_FILE, manifest_model_version
+from model_artifacts import ModelArtifacts, artifact_versions, save_artifacts
+
+# Clustering stage that trains mini-batch KMeans straight from the memory-mapped float32 feature
+# store. Rows are read chunk by chunk, so the matrix is never copied as a whole (the notebook built
+# a float64 copy through Python lists and ran full-batch KMeans on it). Inertia and labels come from
+# a second streaming pass over the chunks; both are saved together with save_clustering().
+
+
+def iter_chunks(vectors, chunk_rows):
+    for start in range(0, len(vectors), chunk_rows):
+        yield start, np.asarray(vectors[start:start + chunk_rows], dtype=np.float32)
+
+
+def initial_centroids(vectors, n_clusters, sample_size, seed):
+    # k-means++ on a random sample of rows; fancy indexing a memmap only reads those rows
+    from sklearn.cluster import KMeans
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+    sample = np.asarray(vectors[rows], dtype=np.float32)
+    return KMeans(n_clusters=n_clusters, n_init=1, random_state=seed).fit(sample).cluster_centers_.astype(np.float32)
+
+
+def assign_clusters(vectors, centroids, chunk_rows=65536):
+    """
+    Nearest centroid of every row, streamed in chunks.
+
+    :return: (int32 labels, inertia as the sum of squared distances to the nearest centroid)
+    """
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    inertia = 0.0
+    for start, chunk in iter_chunks(vectors, chunk_rows):
+        distances = centroid_norms[None, :] - 2 * (chunk @ centroids.T)
+        nearest = distances.argmin(axis=1)
+        labels[start:start + len(chunk)] = nearest
+        closest = distances[np.arange(len(chunk)), nearest] + np.einsum('ij,ij->i', chunk, chunk)
+        inertia += float(np.maximum(closest, 0).sum())
+    return labels, inertia
+
+
+def minibatch_kmeans(vectors, n_clusters=10, batch_size=4096, epochs=3, chunk_rows=65536, sample_size=50000,
+                     seed=42):
+    """
+    Mini-batch KMeans over a (possibly memory-mapped) matrix, reading chunk_rows rows at a time.
+
+    :param vectors: (n, d) matrix, e.g. a feature store .npy opened with mmap_mode='r'
+    :param n_clusters: Number of clusters
+    :param batch_size: Rows per mini-batch update
+    :param epochs: Passes over the matrix
+    :param chunk_rows: Rows read from the matrix at a time, bounds the working memory
+    :param sample_size: Rows sampled for the k-means++ initialisation
+    :param seed: Random seed
+    :return: Dict with centroids, labels, inertia, seconds and peak_bytes (traced peak allocation)
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    # chunks and the initialisation sample are at most an eighth of the matrix rows. That keeps the
+    # peak well below the matrix for large, wide matrices (about 60 MB for 400k x 100 float32), but
+    # sklearn's fixed overhead and the int32 labels dominate small or narrow ones (the 2 and 4
+    # column genre and keyword matrices), which can peak above their own size
+    fraction = max(len(vectors) // 8, batch_size)
+    chunk_rows = min(chunk_rows, fraction)
+    sample_size = max(min(sample_size, fraction), 10 * n_clusters)
+
+    centroids = initial_centroids(vectors, n_clusters, sample_size, seed)
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, init=centroids, n_init=1, batch_size=batch_size,
+                             random_state=seed)
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        # visit the chunks in a different order every epoch, and shuffle the rows inside each chunk
+        # through an index permutation, so only one mini-batch is copied at a time
+        for chunk_start in rng.permutation(np.arange(0, len(vectors), chunk_rows)):
+            chunk = np.asarray(vectors[chunk_start:chunk_start + chunk_rows], dtype=np.float32)
+            order = rng.permutation(len(chunk))
+            for batch_start in range(0, len(chunk), batch_size):
+                kmeans.partial_fit(chunk[order[batch_start:batch_start + batch_size]])
+    train_seconds = time.perf_counter() - start
+
+    centroids = kmeans.cluster_centers_.astype(np.float32)
+    labels, inertia = assign_clusters(vectors, centroids, chunk_rows)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'centroids': centroids,
+        'labels': labels,
+        'inertia': inertia,
+        'train_seconds': train_seconds,
+        'seconds': time.perf_counter() - start,
+        'peak_bytes': peak_bytes,
+    }
+
+
+def save_clustering(store_dir, artifact_dir, results):
+    """
+    Store new centroids and the matching cluster labels together.
+
+    The centroids become the next artifact version and the labels replace the cluster columns of the
+    store metadata, so later incremental builds never mix labels from two clusterings. The store's
+    manifest is pointed at the new version.
+
+    :param store_dir: Feature store directory
+    :param artifact_dir: Directory of the versioned model artifacts
+    :param results: Dict of search mode -> minibatch_kmeans() result
+    :return: The new artifact version, None if there were no artifacts to extend
+    """
+    if not artifact_versions(artifact_dir):
+        print(f"No model artifacts in {artifact_dir}, the new clustering is not saved. "
+              f"Build them with incremental_build.py first.")
+        return None
+
+    # the new version extends the models the store was built with
+    centroids = {f'{mode}_centroids': result['centroids'] for mode, result in results.items()}
+    models = ModelArtifacts(artifact_dir, manifest_model_version(store_dir)).models()
+    version = save_artifacts({**models, **centroids}, artifact_dir)
+
+    metadata_path = os.path.join(store_dir, METADATA_FILE)
+    metadata = pd.read_parquet(metadata_path)
+    for mode, result in results.items():
+        metadata[CLUSTER_COLUMNS[mode]] = result['labels']
+    temp_path = f"{metadata_path}.tmp"
+    metadata.to_parquet(temp_path, index=False)
+    os.replace(temp_path, metadata_path)
+    print(f"Saved the cluster labels of {len(metadata)} movies to {metadata_path}")
+
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        manifest = pd.read_parquet(manifest_path).assign(model_version=version)
+        manifest.to_parquet(f"{manifest_path}.tmp", index=False)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+    return version
+
+
+if __name__ == "__main__":
+    store_dir = "feature_store"
+    artifact_dir = "model_artifacts"
+    n_clusters = 10
+
+    metadata, matrices = load_feature_store(store_dir, mmap=True)
+    results = {}
+    for mode, matrix in matrices.items():
+        vectors = matrix['vectors']
+        results[mode] = minibatch_kmeans(vectors, n_clusters)
+        result = results[mode]
+        print(f"{mode}: inertia {result['inertia']:.4g}, trained in {result['train_seconds']:.2f} seconds "
+              f"({result['seconds']:.2f} with labelling), peak {result['peak_bytes'] / 1e6:.1f} MB "
+              f"for a {vectors.nbytes / 1e6:.1f} MB matrix")
+
+    save_clustering(store_dir, artifact_dir, results)
@@ -0,0 +1,68 @@
+import re
+import numpy as np
+import pandas as pd
+
+IMDB_ID_PATTERN = re.compile(r'^tt\d+$')
+TITLE_YEAR_PATTERN = re.compile(r'^(.*\S)\s*\((\d{4})\)$')
+
+
+def normalize_title(title):
+    return title.strip().casefold()
+
+
+def build_title_index(df):
+    """
+    Build hash lookups from title and imdb_id to row positions in the dataframe.
+
+    :param df: Movie dataframe loaded from movie_pickle.pkl
+    :return: Dict with 'titles' (normalized title -> row positions), 'imdb_ids' (imdb_id -> row position)
+             and 'years' (release year per row, 0 if unknown)
+    """
+    positions = pd.Series(np.arange(len(df)))
+    keys = df['title'].fillna('').astype(str).str.strip().str.casefold().to_numpy()
+    titles = positions.groupby(keys).indices
+
+    imdb_ids = {}
+    for row, imdb_id in enumerate(df['imdb_id'].to_numpy()):
+        if isinstance(imdb_id, str):
+            imdb_ids.setdefault(imdb_id, row)
+
+    years = pd.to_datetime(df['release_date'], errors='coerce').dt.year.fillna(0).astype(int).to_numpy()
+
+    return {'titles': titles, 'imdb_ids': imdb_ids, 'years': years}
+
+
+def lookup_movie(index, query, year=None):
+    """
+    Find every row matching a title or imdb_id in constant time.
+
+    A title may carry its release year as "Title (2010)" to pick between duplicates.
+
+    :param index: Index returned by build_title_index()
+    :param query: Movie title or IMDb ID
+    :param year: Optional release year to narrow duplicate titles
+    :return: List of matching row positions, empty if none
+    """
+    query = query.strip()
+    if IMDB_ID_PATTERN.match(query):
+        row = index['imdb_ids'].get(query)
+        return [] if row is None else [row]
+
+    rows = index['titles'].get(normalize_title(query))
+    if rows is None:
+        title_year = TITLE_YEAR_PATTERN.match(query)
+        if not title_year:
+            return []
+        rows = index['titles'].get(normalize_title(title_year.group(1)))
+        year = int(title_year.group(2))
+        if rows is None:
+            return []
+
+    if year is not None:
+        rows = [row for row in rows if index['years'][row] == year]
+    return [int(row) for row in rows]
+
+
+def describe_candidate(df, index, row):
+    year = index['years'][row]
+    return f"{df['title'].iat[row]} ({year if year else 'unknown year'}) [{df['imdb_id'].iat[row]}]"
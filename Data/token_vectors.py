@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# Vectorized genre/keyword aggregation. A movie's combined vector is the mean of its tokens'
+# vectors; instead of averaging a Python list per row, the tokens are encoded once into a sparse
+# movie x token incidence matrix, and every combined vector comes from one sparse matrix multiply
+# against the token table, divided by the number of tokens per movie.
+
+
+def explode_tokens(values):
+    """
+    Split comma separated token strings, like the genres and keywords cells of NLP.ipynb.
+
+    :param values: Series of "Drama, Crime" strings, NaN for movies without tokens
+    :return: Series of lowercased, stripped tokens indexed by the movie's position in values
+    """
+    tokens = values.reset_index(drop=True).str.lower().str.split(',').explode().dropna()
+    return tokens.str.strip()
+
+
+def token_incidence(exploded, n_rows, vocabulary):
+    """
+    Sparse movie x token count matrix.
+
+    :param exploded: Series of tokens indexed by movie position, e.g. from explode_tokens()
+    :param n_rows: Number of movies
+    :param vocabulary: Sequence of tokens, column i of the matrix counts vocabulary[i]
+    :return: (n_rows, len(vocabulary)) csr_matrix, repeated tokens count repeatedly
+    """
+    columns = pd.Index(vocabulary).get_indexer(exploded.to_numpy())
+    if (columns < 0).any():
+        unknown = exploded[columns < 0].unique()
+        raise ValueError(f"{len(unknown)} tokens are not in the vocabulary, e.g. {list(unknown[:5])}")
+
+    rows = exploded.index.to_numpy(dtype=np.int64)
+    order = np.argsort(rows, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_rows))])
+    data = np.ones(len(columns), dtype=np.float32)
+    return csr_matrix((data, columns[order], indptr), shape=(n_rows, len(vocabulary)))
+
+
+def combine_token_vectors(incidence, table):
+    """
+    Mean token vector of every movie.
+
+    :param incidence: Movie x token csr_matrix from token_incidence()
+    :param table: (len(vocabulary), d) token vectors
+    :return: float32 (n_rows, d) matrix, zeros for movies without tokens
+    """
+    sums = np.asarray(incidence @ np.asarray(table, dtype=np.float32), dtype=np.float32)
+    counts = np.diff(incidence.indptr).astype(np.float32)
+    return sums / np.maximum(counts, 1)[:, None]